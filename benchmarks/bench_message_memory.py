@@ -0,0 +1,88 @@
+"""Measure the memory retained per conversation turn.
+
+Compares the original dataclass-based ContentBlock/Message representation
+with the slotted, type-specialised blocks in mcp_host.chat_session.
+
+    python benchmarks/bench_message_memory.py [--turns N]
+"""
+import sys
+import gc
+import argparse
+import tracemalloc
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from mcp_host.chat_session import ContentBlock, Message
+
+
+@dataclass
+class LegacyContentBlock:
+    """The original ContentBlock, kept here as the baseline."""
+    type: str
+    text: Optional[str] = None
+    id: Optional[str] = None
+    tool_use_id: Optional[str] = None
+    name: Optional[str] = None
+    input: Optional[Any] = None
+    content: Optional[Any] = None
+
+
+@dataclass
+class LegacyMessage:
+    """The original Message, kept here as the baseline."""
+    role: str
+    content: List[LegacyContentBlock]
+
+
+def build_turn(i: int, block_class, message_class) -> list:
+    """Build one typical tool-using turn: prompt, tool call, tool result, answer."""
+    # Distinct strings per turn so nothing is shared through interning
+    prompt = f"What is the forecast for location {i}?"
+    result = f"Forecast {i}: sunny, high of {i % 40} degrees. " * 8
+    answer = f"The forecast for location {i} is sunny."
+    tool_id = f"call-{i:08d}"
+    return [
+        message_class(role="user", content=[block_class(type="text", text=prompt)]),
+        message_class(role="assistant", content=[block_class(
+            type="tool_use", id=tool_id, name="weather__get_forecast",
+            input={"latitude": 40.0 + i / 1000, "longitude": -74.0}
+        )]),
+        message_class(role="tool", content=[block_class(
+            type="tool_result", tool_use_id=tool_id,
+            content=[{"type": "text", "text": result}]
+        )]),
+        message_class(role="assistant", content=[block_class(type="text", text=answer)]),
+    ]
+
+
+def measure(turns: int, block_class, message_class) -> float:
+    """Return the bytes retained per turn for a representation."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    history = [build_turn(i, block_class, message_class) for i in range(turns)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del history
+    return (after - before) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes retained per conversation turn")
+    parser.add_argument("--turns", type=int, default=20000, help="Number of turns to build")
+    args = parser.parse_args()
+
+    legacy = measure(args.turns, LegacyContentBlock, LegacyMessage)
+    current = measure(args.turns, ContentBlock, Message)
+
+    print(f"Turns measured:          {args.turns}")
+    print(f"Before (dataclass):      {legacy:,.0f} bytes/turn")
+    print(f"After (slotted blocks):  {current:,.0f} bytes/turn")
+    print(f"Saved:                   {legacy - current:,.0f} bytes/turn ({(1 - current / legacy) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Measure SSE parsing throughput on large tool results.
+
+Compares the original line-by-line parsing in SSEClient with the
+incremental byte parser in mcp_host.sse_parser, both fed the same stream
+cut into network-sized chunks. Line splitting for the original parser is
+done in-process, so the per-line await on aiohttp's reader that it paid
+in SSEClient is not counted.
+
+    python benchmarks/bench_sse_parser.py [--events N] [--size BYTES] [--chunk BYTES] [--no-json]
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from mcp_host.sse_parser import SSEParser
+
+logger = logging.getLogger("mcp-host")
+
+
+def build_stream(events: int, size: int) -> bytes:
+    """Build an event stream of tools/call responses with results of about size bytes."""
+    parts = [b"event: endpoint\r\ndata: /messages/?session_id=bench\r\n\r\n"]
+    for i in range(events):
+        text = (f"Forecast line {i}: sunny, high of {i % 40} degrees. " * (size // 48 + 1))[:size]
+        message = {"jsonrpc": "2.0", "id": i, "result": {"content": [{"type": "text", "text": text}]}}
+        parts.append(b"event: message\r\ndata: " + json.dumps(message).encode() + b"\r\n\r\n")
+    return b"".join(parts)
+
+
+def split_lines(chunks):
+    """Yield lines the way iterating aiohttp's StreamReader does."""
+    pending = []
+    for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end == -1:
+                pending.append(chunk[start:])
+                break
+            pending.append(chunk[start:end + 1])
+            yield b"".join(pending)
+            pending = []
+            start = end + 1
+
+
+def decode_json(payload):
+    """Decode a message payload, replaced by a no-op with --no-json."""
+    return json.loads(payload)
+
+
+def legacy_parse(chunks) -> int:
+    """The original parser: decode every line, keep only the last data line."""
+    count = 0
+    event_type = None
+    event_data = None
+    for line_bytes in split_lines(chunks):
+        line = line_bytes.decode('utf-8').rstrip()
+        logger.debug(f"SSE line: {line}")
+        if not line:
+            if event_type and event_data:
+                logger.debug(f"Handling event: type={event_type}, data={event_data}")
+                if event_type == "message":
+                    decode_json(event_data)
+                    count += 1
+            event_type = None
+            event_data = None
+            continue
+        if line.startswith("event:"):
+            event_type = line[6:].strip()
+            continue
+        if line.startswith("data:"):
+            event_data = line[5:].strip()
+            continue
+    return count
+
+
+def incremental_parse(chunks) -> int:
+    """The incremental parser: raw bytes in, payloads straight to the JSON decoder."""
+    count = 0
+    parser = SSEParser()
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            if event.event == "message":
+                decode_json(event.data)
+                count += 1
+    return count
+
+
+def measure(parse, chunks, events: int, repeat: int) -> float:
+    """Return events parsed per second, best of several runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parsed = parse(chunks)
+        best = min(best, time.perf_counter() - start)
+        assert parsed == events, f"parsed {parsed} of {events} events"
+    return events / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE events parsed per second")
+    parser.add_argument("--events", type=int, default=2000, help="Number of message events")
+    parser.add_argument("--size", type=int, default=64 * 1024, help="Tool result size in bytes")
+    parser.add_argument("--chunk", type=int, default=16 * 1024, help="Network chunk size in bytes")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per parser, the best is reported")
+    parser.add_argument("--no-json", action="store_true", help="Measure parsing alone, without JSON decoding")
+    args = parser.parse_args()
+
+    global decode_json
+    if args.no_json:
+        decode_json = lambda payload: None
+
+    stream = build_stream(args.events, args.size)
+    chunks = [stream[i:i + args.chunk] for i in range(0, len(stream), args.chunk)]
+
+    legacy = measure(legacy_parse, chunks, args.events, args.repeat)
+    current = measure(incremental_parse, chunks, args.events, args.repeat)
+
+    print(f"Events: {args.events} x {args.size:,} bytes in {args.chunk:,}-byte chunks"
+          f"{', parsing only' if args.no_json else ', including JSON decoding'}")
+    print(f"Before (line parser):        {legacy:,.0f} events/s")
+    print(f"After (incremental parser):  {current:,.0f} events/s")
+    print(f"Speedup:                     {current / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
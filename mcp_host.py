@@ -27,12 +27,14 @@ except ImportError:
 
 # Import MCP Host modules
 from mcp_host.config import ConfigLoader, ServerConfig, LLMProviderConfig
-from mcp_host.client_manager import MCPClientManager
+from mcp_host.client_manager import MCPClientManager, DEFAULT_TOOL_SNAPSHOT_PATH
 from mcp_host.ollama_provider import OllamaProvider
 from mcp_host.chat_session import ChatSession, Message, ContentBlock
+from mcp_host.http_pool import http_pool
+from mcp_host.ssh_pool import ssh_pool
 
 # Constants
-DEFAULT_MESSAGE_WINDOW = 10
+DEFAULT_MESSAGE_WINDOW = None  # No fixed cap, history is bounded by the model's context length
 MAX_RETRIES = 3
 INITIAL_BACKOFF = 1  # seconds
 MAX_BACKOFF = 30     # seconds
@@ -40,11 +42,16 @@ MAX_BACKOFF = 30     # seconds
 async def run_chat_session(
     config_path: str = None, 
     model: str = None, 
-    message_window: int = DEFAULT_MESSAGE_WINDOW,
-    provider_overrides: Dict[str, Any] = None
+    message_window: Optional[int] = DEFAULT_MESSAGE_WINDOW,
+    provider_overrides: Dict[str, Any] = None,
+    tool_snapshot: bool = True,
+    stream: bool = False,
+    tool_top_k: Optional[int] = None,
+    always_include_tools: List[str] = None
 ):
     """Run the main chat session."""
     mcp_manager = None
+    llm_provider = None
     
     try:
         # Load server configurations
@@ -56,13 +63,23 @@ async def run_chat_session(
             return
         
         # Create MCP client manager
-        mcp_manager = MCPClientManager(server_configs)
-        await mcp_manager.initialize_clients()
+        mcp_manager = MCPClientManager(
+            server_configs,
+            snapshot_path=DEFAULT_TOOL_SNAPSHOT_PATH if tool_snapshot else None
+        )
         
-        if not mcp_manager.clients:
-            logger.error("Failed to initialize any MCP clients.")
-            print("Failed to initialize any MCP clients. Check your configuration and logs.")
-            return
+        # With a snapshot for every server, serve tools from it immediately
+        # and connect to the servers in the background
+        background_startup = mcp_manager.load_tool_snapshot()
+        if background_startup:
+            mcp_manager.start_background_initialization()
+        else:
+            await mcp_manager.initialize_clients()
+            
+            if not mcp_manager.clients and not mcp_manager.cached_tools:
+                logger.error("Failed to initialize any MCP clients.")
+                print("Failed to initialize any MCP clients. Check your configuration and logs.")
+                return
         
         # Prepare LLM config
         if not llm_config:
@@ -93,12 +110,16 @@ async def run_chat_session(
             url=llm_config.url or "http://localhost:11434",
             parameters=llm_config.parameters or {}
         )
+        if not await llm_provider.connect():
+            print("Warning: could not reach Ollama, requests may fail. Check the URL and logs.")
         
         # Create chat session
         chat_session = ChatSession(
             llm_provider=llm_provider,
             mcp_manager=mcp_manager,
-            message_window=message_window
+            message_window=message_window,
+            tool_top_k=tool_top_k,
+            always_include_tools=always_include_tools
         )
         
         # Print provider info
@@ -110,7 +131,15 @@ async def run_chat_session(
         print(f"Provider: {provider_type}")
         print(f"Model: {provider_model}")
         print(f"Ollama URL: {provider_url}")
-        print(f"Connected MCP Servers: {len(mcp_manager.clients)}")
+        if background_startup:
+            print(f"MCP Servers: {len(server_configs)} starting in background (tools loaded from snapshot)")
+        else:
+            print(f"Connected MCP Servers: {len(mcp_manager.clients)}")
+            for name, report in mcp_manager.startup_report.items():
+                detail = f" ({report['error']})" if report["error"] else ""
+                print(f"  - {name}: {report['status']} in {report['elapsed']:.2f}s{detail}")
+            for name in mcp_manager.starting_servers():
+                print(f"  - {name}: still starting in background")
         
         print("\nType 'exit' or 'quit' to quit.")
         print("Type 'tools' to list available tools.")
@@ -126,23 +155,48 @@ async def run_chat_session(
                     break
                 
                 if prompt.lower() == "tools":
-                    # List available tools
-                    tools = await mcp_manager.get_all_tools()
+                    # List available tools, re-listing every server
+                    tools = await mcp_manager.get_all_tools(force_refresh=True)
                     print("\nAvailable Tools:")
                     for tool in tools:
                         print(f"  - {tool['name']}: {tool.get('description', 'No description')}")
                     continue
                 
                 if prompt.lower() == "servers":
-                    # List connected servers
-                    print("\nConnected Servers:")
-                    for name, client in mcp_manager.clients.items():
-                        print(f"  - {name}: {client.config.type}")
+                    # List configured servers and whether they are connected
+                    print("\nServers:")
+                    for name, config in server_configs.items():
+                        if name in mcp_manager.clients:
+                            state = "connected"
+                        elif config.lazy:
+                            state = "idle (connects on first use)"
+                        else:
+                            state = mcp_manager.startup_report.get(name, {}).get("status", "starting")
+                        cache = mcp_manager.cache_stats().get(name)
+                        if cache:
+                            state += f", result cache {cache['hits']} hits / {cache['misses']} misses"
+                        print(f"  - {name}: {config.type}, {state}")
+                    pool = http_pool.stats()
+                    print(f"HTTP pool: {pool['requests']} requests, {pool['connections_created']} connections opened, "
+                          f"{pool['connections_reused']} reused, {pool['queued']} waited for a free connection")
+                    ssh = ssh_pool.stats()
+                    if ssh["connections_opened"]:
+                        print(f"SSH pool: {ssh['open']} connections open, {ssh['connections_opened']} opened, "
+                              f"{ssh['channels_opened']} server channels started")
                     continue
                 
                 print("\nAssistant: ", end="", flush=True)
-                response = await chat_session.process_prompt(prompt)
-                print(f"{response}")
+                if stream:
+                    # Print tokens as they arrive
+                    async for event in chat_session.process_prompt_stream(prompt):
+                        if event.type == "text":
+                            print(event.text, end="", flush=True)
+                        elif event.type == "tool_call":
+                            print(f"\n[Calling tool: {event.name}]", flush=True)
+                    print()
+                else:
+                    response = await chat_session.process_prompt(prompt)
+                    print(f"{response}")
                 
             except KeyboardInterrupt:
                 print("\nExiting...")
@@ -153,6 +207,8 @@ async def run_chat_session(
     
     finally:
         # Clean up resources
+        if llm_provider is not None:
+            await llm_provider.disconnect()
         if mcp_manager is not None:
             logger.debug("Starting cleanup of MCP manager")
             await mcp_manager.shutdown_all()
@@ -218,7 +274,14 @@ def main():
     # Model parameters
     parser.add_argument("--model", "-m", help="Override model specified in config")
     parser.add_argument("--message-window", type=int, default=DEFAULT_MESSAGE_WINDOW,
-                        help="Number of messages to keep in context")
+                        help="Maximum number of messages to keep in context "
+                             "(default: as many as fit the model's num_ctx)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print the response token by token as it is generated")
+    parser.add_argument("--tool-top-k", type=int,
+                        help="Send only the N tools most relevant to each prompt (default: send all tools)")
+    parser.add_argument("--always-include-tool", action="append", default=[], metavar="TOOL",
+                        help="Tool to send with every prompt when --tool-top-k is set (repeatable)")
     
     # Provider selection
     provider_group = parser.add_argument_group("Provider Selection")
@@ -234,6 +297,8 @@ def main():
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     parser.add_argument("--save-config", action="store_true", 
                        help="Save provider options to config file")
+    parser.add_argument("--no-tool-snapshot", action="store_true",
+                       help="Don't read or write the on-disk tool catalog snapshot")
     
     args = parser.parse_args()
     
@@ -276,7 +341,11 @@ def main():
         config_path=args.config,
         model=args.model,
         message_window=args.message_window,
-        provider_overrides=provider_overrides if provider_overrides else None
+        provider_overrides=provider_overrides if provider_overrides else None,
+        tool_snapshot=not args.no_tool_snapshot,
+        stream=args.stream,
+        tool_top_k=args.tool_top_k,
+        always_include_tools=args.always_include_tool
     ))
 
 if __name__ == "__main__":
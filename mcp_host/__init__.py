@@ -1,5 +1,7 @@
 # MCP Host Package
 from .sse_client import SSEClient
+from .ssh_client import SSHClient
 from .stdio_client import StdioClient
+from .streamable_http_client import StreamableHTTPClient
 
-__all__ = ['SSEClient', 'StdioClient']
+__all__ = ['SSEClient', 'SSHClient', 'StdioClient', 'StreamableHTTPClient']
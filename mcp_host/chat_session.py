@@ -1,23 +1,93 @@
 import json
+import asyncio
 import logging
+import time
 import uuid
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from collections import deque
 from dataclasses import dataclass, field
 
 logger = logging.getLogger("mcp-host")
 
-@dataclass
 class ContentBlock:
-    """Content block for messages."""
-    type: str
+    """Content block for messages.
+    
+    Calling ContentBlock(type=..., ...) returns the slotted subclass for that
+    type. Fields a block type doesn't carry read as None.
+    """
+    __slots__ = ()
+    type: str = None
     text: Optional[str] = None
     id: Optional[str] = None
     tool_use_id: Optional[str] = None
     name: Optional[str] = None
     input: Optional[Any] = None
     content: Optional[Any] = None
+    
+    _fields: Tuple[str, ...] = ()
+    
+    def __new__(cls, type: str = None, **kwargs):
+        if cls is ContentBlock:
+            block_class = _BLOCK_TYPES.get(type)
+            if block_class is None:
+                raise ValueError(f"Unsupported content block type: {type}")
+            cls = block_class
+        return object.__new__(cls)
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ContentBlock) or self.type != other.type:
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self._fields)
+    
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{self.__class__.__name__}({fields})"
 
-@dataclass
+class TextBlock(ContentBlock):
+    """Plain text content."""
+    __slots__ = ("text",)
+    type = "text"
+    _fields = ("text",)
+    
+    def __init__(self, type: str = "text", text: Optional[str] = None):
+        self.text = text
+
+class ToolUseBlock(ContentBlock):
+    """A tool call requested by the assistant."""
+    __slots__ = ("id", "name", "input")
+    type = "tool_use"
+    _fields = ("id", "name", "input")
+    
+    def __init__(self, type: str = "tool_use", id: Optional[str] = None, name: Optional[str] = None, input: Optional[Any] = None):
+        self.id = id
+        self.name = name
+        self.input = input
+
+class ToolResultBlock(ContentBlock):
+    """The result of a tool call.
+    
+    Results made only of text items are stored as one string, which every
+    consumer already accepts, instead of a list of dicts.
+    """
+    __slots__ = ("tool_use_id", "content")
+    type = "tool_result"
+    _fields = ("tool_use_id", "content")
+    
+    def __init__(self, type: str = "tool_result", tool_use_id: Optional[str] = None, content: Optional[Any] = None):
+        self.tool_use_id = tool_use_id
+        if isinstance(content, list) and content and all(
+            isinstance(item, dict) and item.get("type") == "text" and len(item) == 2 and isinstance(item.get("text"), str)
+            for item in content
+        ):
+            content = "".join(item["text"] for item in content)
+        self.content = content
+
+_BLOCK_TYPES = {
+    block_class.type: block_class
+    for block_class in (TextBlock, ToolUseBlock, ToolResultBlock)
+}
+
+@dataclass(slots=True)
 class Message:
     """A message in the conversation."""
     role: str
@@ -51,6 +121,119 @@ class Message:
         """Check if message has any meaningful content."""
         return len(self.content) > 0
 
+    def content_chars(self) -> int:
+        """Count the characters of text and tool result content, for token estimates."""
+        chars = 0
+        for block in self.content:
+            if block.type == "text" and block.text:
+                chars += len(block.text)
+            elif block.type == "tool_result" and block.content:
+                if isinstance(block.content, list):
+                    for content_item in block.content:
+                        if isinstance(content_item, dict) and content_item.get("type") == "text":
+                            chars += len(content_item.get("text", ""))
+                elif isinstance(block.content, str):
+                    chars += len(block.content)
+        return chars
+
+class MessageStore:
+    """Conversation history with indexes kept up to date on append and eviction.
+    
+    Behaves like a list of messages, and additionally maps tool_use ids to
+    the tool name and assistant message that issued them, keeps a view of
+    the messages for each role, and keeps running content sizes so the
+    size of any front slice is a lookup. Messages are only ever added at
+    the end and evicted from the front.
+    """
+    
+    def __init__(self, messages: List[Message] = None):
+        self._messages: List[Message] = []
+        self._tool_uses: Dict[str, Tuple[str, Message]] = {}  # tool_use_id -> (tool name, message)
+        self._by_role: Dict[str, deque] = {}
+        self.evicted = 0  # Total messages ever evicted, lets caches of the history detect eviction
+        self._cumulative_chars: List[int] = []  # Content chars of every message ever added, up to and including each one
+        self._evicted_chars = 0  # Content chars of the evicted messages
+        self._user_positions: deque = deque()  # Absolute positions of user messages, where turns start
+        for message in messages or []:
+            self.append(message)
+    
+    def append(self, message: Message):
+        """Add a message to the end of the history."""
+        self._messages.append(message)
+        self._by_role.setdefault(message.role, deque()).append(message)
+        previous = self._cumulative_chars[-1] if self._cumulative_chars else self._evicted_chars
+        self._cumulative_chars.append(previous + message.content_chars())
+        if message.role == "user":
+            self._user_positions.append(self.evicted + len(self._messages) - 1)
+        for block in message.content:
+            if block.type == "tool_use" and block.id:
+                self._tool_uses[block.id] = (block.name, message)
+    
+    def evict_front(self, count: int):
+        """Remove the oldest count messages."""
+        evicted = self._messages[:count]
+        del self._messages[:count]
+        self.evicted += len(evicted)
+        if evicted:
+            self._evicted_chars = self._cumulative_chars[len(evicted) - 1]
+            del self._cumulative_chars[:len(evicted)]
+        while self._user_positions and self._user_positions[0] < self.evicted:
+            self._user_positions.popleft()
+        for message in evicted:
+            # Eviction is oldest-first, so each message heads its role's view
+            self._by_role[message.role].popleft()
+            for block in message.content:
+                if block.type == "tool_use" and block.id:
+                    self._tool_uses.pop(block.id, None)
+    
+    def find_tool_use(self, tool_use_id: str) -> Optional[Tuple[str, Message]]:
+        """Get the (tool name, assistant message) that issued a tool call."""
+        return self._tool_uses.get(tool_use_id)
+    
+    def tool_name(self, tool_use_id: str) -> Optional[str]:
+        """Get the name of the tool a tool call id refers to."""
+        entry = self._tool_uses.get(tool_use_id)
+        return entry[0] if entry else None
+    
+    def by_role(self, role: str) -> deque:
+        """Get the messages with the given role, oldest first."""
+        return self._by_role.get(role, deque())
+        
+    def chars_from(self, start: int = 0) -> int:
+        """Get the content chars of the messages from index start to the end."""
+        if start >= len(self._messages):
+            return 0
+        before = self._cumulative_chars[start - 1] if start else self._evicted_chars
+        return self._cumulative_chars[-1] - before
+        
+    def turn_starts(self):
+        """Yield the indexes of user messages, where turns start, oldest first."""
+        for position in self._user_positions:
+            yield position - self.evicted
+    
+    def __len__(self) -> int:
+        return len(self._messages)
+    
+    def __iter__(self):
+        return iter(self._messages)
+    
+    def __reversed__(self):
+        return reversed(self._messages)
+    
+    def __getitem__(self, index):
+        return self._messages[index]
+
+@dataclass
+class StreamEvent:
+    """An incremental event produced while a response is being generated."""
+    type: str  # "text", "tool_call", "tool_result", "message" or "done"
+    text: Optional[str] = None  # Text delta, or the full answer for "done"
+    id: Optional[str] = None  # Tool call id for "tool_call" and "tool_result"
+    name: Optional[str] = None  # Tool name for "tool_call"
+    input: Optional[Any] = None  # Tool arguments for "tool_call"
+    message: Optional[Message] = None  # Assembled message for "message" and "tool_result"
+    ttft: Optional[float] = None  # Seconds until the first token, for "message" and "done"
+
 class ChatSession:
     """Manage a chat session with message history and tool execution."""
     
@@ -58,17 +241,26 @@ class ChatSession:
         self, 
         llm_provider: Any, 
         mcp_manager: Any,
-        message_window: int = 10
+        message_window: Optional[int] = None,
+        tool_top_k: Optional[int] = None,
+        always_include_tools: List[str] = None
     ):
         self.llm_provider = llm_provider
         self.mcp_manager = mcp_manager
-        self.message_window = message_window
-        self.messages = []
+        self.message_window = message_window  # Optional hard cap on message count, the token budget applies regardless
+        self.tool_top_k = tool_top_k  # Send only this many prompt-relevant tools, None to send all
+        self.always_include_tools = always_include_tools or []  # Tools sent regardless of relevance
+        self.messages = MessageStore()
         self.tool_mapping = {}  # Maps non-namespaced tool names to their full namespaced versions
+        self.tool_mapping_version = None  # Catalog version the mapping was built from
+        self.round_timings: List[Dict[str, Any]] = []  # Per-round timings of the last prompt
         
     async def refresh_tool_mapping(self):
         """Create a mapping of non-namespaced tool names to their namespaced versions."""
         tools = await self.mcp_manager.get_all_tools()
+        if self.tool_mapping_version == self.mcp_manager.catalog_version:
+            return tools
+        
         self.tool_mapping = {}
         
         for tool in tools:
@@ -79,6 +271,7 @@ class ChatSession:
                 self.tool_mapping[original_name] = tool["name"]
                 self.tool_mapping[tool["name"]] = tool["name"]  # Map to itself for completeness
                 
+        self.tool_mapping_version = self.mcp_manager.catalog_version
         logger.debug(f"Tool mapping refreshed: {self.tool_mapping}")
         return tools
         
@@ -87,165 +280,253 @@ class ChatSession:
         if message and message.has_content():
             self.messages.append(message)
             
-            # Prune messages if we exceed the window
-            if len(self.messages) > self.message_window:
-                self.messages = self.messages[-self.message_window:]
+            # Prune whole turns if we exceed the window
+            if self.message_window and len(self.messages) > self.message_window:
+                self._evict_turns(lambda cut: len(self.messages) - cut <= self.message_window)
+    
+    def _evict_turns(self, fits) -> int:
+        """Drop the fewest whole turns from the front of the history so that fits(cut) holds.
+        
+        A turn is a user message together with every assistant and tool
+        message that follows it, so a tool_use is never separated from its
+        tool result. The current (last) turn is always kept.
+        
+        Returns:
+            The number of messages evicted
+        """
+        cut = 0
+        for boundary in self.messages.turn_starts():
+            if boundary == 0:
+                continue
+            cut = boundary
+            if fits(cut):
+                break
+        
+        if cut:
+            self.messages.evict_front(cut)
+        return cut
+    
+    def fit_context(self, tools: List[Dict[str, Any]] = None, tools_version: Optional[int] = None):
+        """Evict the oldest turns until the history fits the model's context budget.
+        
+        The budget comes from the provider's context length minus the tokens
+        reserved for tool definitions and the reply, so Ollama never has to
+        silently clip the prompt.
+        """
+        if not hasattr(self.llm_provider, "prompt_token_budget"):
+            return
+        
+        budget = self.llm_provider.prompt_token_budget(tools, tools_version)
+        
+        def remaining_tokens(cut: int) -> int:
+            # Running sums in the store make this a lookup instead of a rescan
+            return self.llm_provider.estimate_history_tokens(
+                self.messages.chars_from(cut), len(self.messages) - cut
+            )
+            
+        if remaining_tokens(0) <= budget:
+            return
+        
+        evicted = self._evict_turns(lambda cut: remaining_tokens(cut) <= budget)
+        if evicted:
+            logger.info(f"Evicted {evicted} message(s) to fit the {budget}-token context budget")
+        remaining = remaining_tokens(0)
+        if remaining > budget:
+            logger.warning(f"Current turn (~{remaining} tokens) exceeds the {budget}-token context budget")
     
-    async def process_prompt(self, prompt: str) -> str:
+    async def process_prompt(self, prompt: str, max_iterations: int = 5) -> str:
         """Process a user prompt and return the response."""
-        # Add recursion limit to prevent infinite tool call loops
-        return await self._process_prompt_with_limit(prompt, max_iterations=5)
-        
-    async def _process_prompt_with_limit(self, prompt: str, max_iterations: int = 5, current_iteration: int = 0) -> str:
-        """Process a prompt with a limit on tool call iterations."""
-        # Check recursion limit to prevent infinite loops
-        if current_iteration >= max_iterations:
-            logger.warning(f"Reached maximum tool call iterations ({max_iterations}). Forcing final response.")
-            # Force a final response without tools to break the loop
-            return await self._generate_final_response(f"I've reached the maximum number of tool interactions ({max_iterations}).")
-        
-        # Step 1: Add user message to history
-        if prompt and current_iteration == 0:  # Only add user message on first iteration
-            self.add_message(Message(
-                role="user",
-                content=[ContentBlock(type="text", text=prompt)]
-            ))
+        text_content = ""
+        async for event in self._run_agent_loop(prompt, max_iterations, stream=False):
+            if event.type == "done":
+                text_content = event.text
+        return text_content
+    
+    async def process_prompt_stream(self, prompt: str, max_iterations: int = 5) -> AsyncIterator[StreamEvent]:
+        """Process a user prompt, yielding text deltas and tool events as they happen.
+        
+        The last event is always a "done" event carrying the full answer.
+        """
+        async for event in self._run_agent_loop(prompt, max_iterations, stream=True):
+            yield event
+    
+    async def _run_agent_loop(self, prompt: str, max_iterations: int, stream: bool) -> AsyncIterator[StreamEvent]:
+        """Run the tool loop: call the LLM, run the tools it asks for, feed the results back, repeat.
+        
+        Each round costs exactly one generation. The loop ends with a text
+        answer or when max_iterations rounds have been used, in which case
+        the last round is made without tools to force an answer.
+        """
+        start_time = time.perf_counter()
+        ttft = None
+        self.round_timings = []
+        full_catalog = not self.tool_top_k  # Widened when the model asks for a tool it wasn't sent
+        
+        self.add_message(Message(
+            role="user",
+            content=[ContentBlock(type="text", text=prompt)]
+        ))
+        
+        for iteration in range(max_iterations):
+            round_start = time.perf_counter()
             
-        # Step 2: Get all tools and refresh the mapping, but only on first iteration
-        if current_iteration == 0:
+            # Get the cached tool catalog, servers are only re-listed when it changes
             tools = await self.refresh_tool_mapping()
-        else:
-            # Reuse the same tools to avoid unnecessary API calls
-            tools = await self.mcp_manager.get_all_tools(skip_refresh=True)
-        
-        # Only pass tools when we're not at the last iteration
-        tools_to_use = tools if current_iteration < max_iterations - 1 else None
-        
-        # Step 3: Initial LLM call with the complete message history
-        logger.info(f"Making LLM API call (iteration {current_iteration + 1}/{max_iterations})")
-        llm_response = await self.llm_provider.create_message(
-            messages=self.messages,
-            tools=tools_to_use,
-            prompt=None  # Already added to messages
-        )
-        
-        # Log the text content for debugging
-        text_content = llm_response.get_text_content()
-        logger.debug(f"LLM response text: {text_content[:100]}..." if text_content else "No text in response")
-        
-        # Add the LLM's response to the message history
-        self.add_message(llm_response)
-        
-        # Step 4: Check if LLM wants to use tools
-        tool_calls = llm_response.get_tool_calls()
-        
-        if not tool_calls:
-            # No tool calls, just return the LLM's text response
-            logger.info("No tool calls in LLM response")
-            if not text_content:
-                # If there's no text content, generate a fallback response
-                return await self._generate_final_response()
-            return text_content
+            if not full_catalog:
+                tools = await self.mcp_manager.select_tools(prompt, self.tool_top_k, self.always_include_tools)
+            # Only pass tools when we're not at the last iteration
+            tools_to_use = tools if iteration < max_iterations - 1 else None
+            tools_version = self.tool_mapping_version
             
-        logger.info(f"LLM requested {len(tool_calls)} tool call(s)")
-        
-        # Step 5: Process tool calls and collect results
-        for tool_id, tool_name, tool_input in tool_calls:
-            logger.info(f"Processing tool call: {tool_name}")
+            # Call the LLM with as much history as fits the context
+            self.fit_context(tools_to_use, tools_version)
+            logger.info(f"Making LLM API call (iteration {iteration + 1}/{max_iterations})")
+            if stream:
+                llm_response = None
+                async for event in self.llm_provider.stream_message(
+                    messages=self.messages,
+                    tools=tools_to_use,
+                    tools_version=tools_version
+                ):
+                    if event.type == "message":
+                        llm_response = event.message
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - start_time
+                        logger.info(f"Time to first token: {ttft:.2f}s")
+                    yield event
+            else:
+                llm_response = await self.llm_provider.create_message(
+                    messages=self.messages,
+                    tools=tools_to_use,
+                    prompt=None,  # Already added to messages
+                    tools_version=tools_version
+                )
+            llm_time = time.perf_counter() - round_start
             
-            # Parse tool input if it's a string
-            if isinstance(tool_input, str):
-                try:
-                    tool_input = json.loads(tool_input)
-                except json.JSONDecodeError:
-                    tool_input = {"input": tool_input}
-            elif tool_input is None:
-                tool_input = {}
+            self.add_message(llm_response)
+            tool_calls = llm_response.get_tool_calls()
             
-            # Map the tool name to its namespaced version
-            namespaced_tool_name = self._get_namespaced_tool_name(tool_name)
-            if not namespaced_tool_name:
-                logger.error(f"No matching server found for tool: {tool_name}")
-                # Add an error response for this tool
-                self.add_message(Message(
-                    role="tool", # Use "tool" role instead of "user"
-                    content=[ContentBlock(
-                        type="tool_result",
-                        tool_use_id=tool_id,
-                        content=[{
-                            "type": "text", 
-                            "text": f"Error: Tool '{tool_name}' not found or not available in any connected server."
-                        }]
-                    )]
-                ))
-                continue
-                
-            logger.debug(f"Mapped tool name '{tool_name}' to '{namespaced_tool_name}'")
+            if not tool_calls:
+                self._record_round(iteration, llm_time, 0.0, 0)
+                text_content = llm_response.get_text_content()
+                if not text_content:
+                    # If there's no text content, generate a fallback response
+                    text_content = await self._generate_final_response()
+                    yield StreamEvent(type="text", text=text_content)
+                yield StreamEvent(type="done", text=text_content, ttft=ttft)
+                return
+            
+            if tools_to_use is None:
+                # Tool calls on the tool-less final round have no round left to use their results
+                self._record_round(iteration, llm_time, 0.0, 0)
+                break
             
-            # Process the tool input to handle null values
-            processed_input = self._process_tool_arguments(tool_name, tool_input)
+            if not full_catalog:
+                sent = {tool["name"] for tool in tools}
+                unknown = [name for _, name, _ in tool_calls if self._get_namespaced_tool_name(name) not in sent]
+                if unknown:
+                    # The subset missed what the model wanted, show it everything from now on
+                    logger.info(f"Model asked for tool(s) outside the selected subset: {unknown}, sending all tools")
+                    full_catalog = True
+            
+            # Run the tool calls concurrently, the manager bounds per-server concurrency
+            logger.info(f"LLM requested {len(tool_calls)} tool call(s)")
+            tools_start = time.perf_counter()
+            tool_results = await asyncio.gather(*(
+                self._execute_tool_call(tool_id, tool_name, tool_input)
+                for tool_id, tool_name, tool_input in tool_calls
+            ))
+            self._record_round(iteration, llm_time, time.perf_counter() - tools_start, len(tool_calls))
             
-            # Call the tool with the proper namespaced name and processed input
-            logger.info(f"Calling tool: {namespaced_tool_name}")
+            # Add results in the original call order to keep history deterministic
+            for (tool_id, _, _), tool_result in zip(tool_calls, tool_results):
+                self.add_message(tool_result)
+                yield StreamEvent(type="tool_result", id=tool_id, message=tool_result)
+        
+        logger.warning(f"Reached maximum tool call iterations ({max_iterations}). Forcing final response.")
+        text_content = await self._generate_final_response(f"I've reached the maximum number of tool interactions ({max_iterations}).")
+        yield StreamEvent(type="text", text=text_content)
+        yield StreamEvent(type="done", text=text_content, ttft=ttft)
+    
+    def _record_round(self, iteration: int, llm_time: float, tool_time: float, tool_count: int):
+        """Record and log the timing of one LLM + tools round."""
+        self.round_timings.append({
+            "round": iteration + 1,
+            "llm": llm_time,
+            "tools": tool_time,
+            "tool_calls": tool_count
+        })
+        logger.info(f"Round {iteration + 1}: LLM {llm_time:.2f}s, {tool_count} tool call(s) {tool_time:.2f}s")
+        
+    async def _execute_tool_call(self, tool_id: str, tool_name: str, tool_input: Any) -> Message:
+        """Execute a single tool call and return its result as a tool message."""
+        logger.info(f"Processing tool call: {tool_name}")
+        
+        # Parse tool input if it's a string
+        if isinstance(tool_input, str):
             try:
-                result = await self.mcp_manager.call_tool(namespaced_tool_name, processed_input)
-                
-                # Transform the tool result to match expected format
-                transformed_content = self._transform_tool_result_content(result)
-                
-                # Add tool result to message history with "tool" role
-                self.add_message(Message(
-                    role="tool",
-                    content=[ContentBlock(
-                        type="tool_result",
-                        tool_use_id=tool_id,
-                        content=transformed_content
-                    )]
-                ))
-                
-                logger.debug(f"Tool result: {transformed_content}")
-                
-            except Exception as e:
-                # Handle tool call errors
-                logger.error(f"Error calling tool {namespaced_tool_name}: {str(e)}")
-                self.add_message(Message(
-                    role="tool",
-                    content=[ContentBlock(
-                        type="tool_result",
-                        tool_use_id=tool_id,
-                        content=[{
-                            "type": "text", 
-                            "text": f"Error executing tool '{tool_name}': {str(e)}"
-                        }]
-                    )]
-                ))
-        
-        # Step 7: Make a second call to the LLM with the tool results included
-        logger.info("Making follow-up LLM call with tool results")
-        final_response = await self.llm_provider.create_message(
-            messages=self.messages,
-            tools=tools_to_use,  # Keep tools available in case more tool calls are needed
-            prompt=None
-        )
-        
-        # Add the final response to history
-        self.add_message(final_response)
-        
-        # Check if LLM made more tool calls - if so, we need another round
-        if final_response.get_tool_calls() and current_iteration < max_iterations - 1:
-            logger.info("LLM made additional tool calls - processing another round")
-            # Recursive call, but with no new user prompt and increment iteration
-            return await self._process_prompt_with_limit(None, max_iterations, current_iteration + 1)
-        
-        # Step 8: Return the final text content
-        logger.info("Returning final LLM response")
-        text_response = final_response.get_text_content()
-        
-        # If there's no text in the response, generate a simple summary
-        if not text_response:
-            return await self._generate_final_response()
+                tool_input = json.loads(tool_input)
+            except json.JSONDecodeError:
+                tool_input = {"input": tool_input}
+        elif tool_input is None:
+            tool_input = {}
+        
+        # Map the tool name to its namespaced version
+        namespaced_tool_name = self._get_namespaced_tool_name(tool_name)
+        if not namespaced_tool_name:
+            logger.error(f"No matching server found for tool: {tool_name}")
+            # Return an error response for this tool
+            return Message(
+                role="tool", # Use "tool" role instead of "user"
+                content=[ContentBlock(
+                    type="tool_result",
+                    tool_use_id=tool_id,
+                    content=[{
+                        "type": "text", 
+                        "text": f"Error: Tool '{tool_name}' not found or not available in any connected server."
+                    }]
+                )]
+            )
             
-        return text_response
+        logger.debug(f"Mapped tool name '{tool_name}' to '{namespaced_tool_name}'")
+        
+        # Process the tool input to handle null values
+        processed_input = self._process_tool_arguments(tool_name, tool_input)
+        
+        # Call the tool with the proper namespaced name and processed input
+        logger.info(f"Calling tool: {namespaced_tool_name}")
+        try:
+            result = await self.mcp_manager.call_tool(namespaced_tool_name, processed_input)
+            
+            # Transform the tool result to match expected format
+            transformed_content = self._transform_tool_result_content(result)
+            logger.debug(f"Tool result: {transformed_content}")
+            
+            # Tool result message with "tool" role
+            return Message(
+                role="tool",
+                content=[ContentBlock(
+                    type="tool_result",
+                    tool_use_id=tool_id,
+                    content=transformed_content
+                )]
+            )
+            
+        except Exception as e:
+            # Handle tool call errors
+            logger.error(f"Error calling tool {namespaced_tool_name}: {str(e)}")
+            return Message(
+                role="tool",
+                content=[ContentBlock(
+                    type="tool_result",
+                    tool_use_id=tool_id,
+                    content=[{
+                        "type": "text", 
+                        "text": f"Error executing tool '{tool_name}': {str(e)}"
+                    }]
+                )]
+            )
     
     async def _generate_final_response(self, fallback_text=None):
         """Generate a generic final response when the LLM isn't producing text."""
@@ -259,34 +540,25 @@ class ChatSession:
         tool_data = None
         tool_name = None
         
-        for msg in reversed(self.messages):
-            if msg.role == "tool":
-                for block in msg.content:
-                    if block.type == "tool_result":
-                        # Extract tool name from tool use if possible
-                        for i, prev_msg in enumerate(reversed(self.messages[:self.messages.index(msg)])):
-                            if prev_msg.role == "assistant":
-                                for prev_block in prev_msg.content:
-                                    if prev_block.type == "tool_use" and prev_block.id == block.tool_use_id:
-                                        tool_name = prev_block.name
-                                        break
-                                if tool_name:
-                                    break
-                        
-                        # Extract tool result content
-                        if isinstance(block.content, list):
-                            for content_item in block.content:
-                                if isinstance(content_item, dict) and content_item.get("type") == "text":
-                                    tool_data = content_item.get("text")
-                                    break
-                        elif isinstance(block.content, str):
-                            tool_data = block.content
-                        
-                        if tool_data:
-                            break
-                
-                if tool_data:
-                    break
+        for msg in reversed(self.messages.by_role("tool")):
+            for block in msg.content:
+                if block.type == "tool_result":
+                    # Extract tool result content
+                    if isinstance(block.content, list):
+                        for content_item in block.content:
+                            if isinstance(content_item, dict) and content_item.get("type") == "text":
+                                tool_data = content_item.get("text")
+                                break
+                    elif isinstance(block.content, str):
+                        tool_data = block.content
+                    
+                    if tool_data:
+                        # Look up the tool name from the tool use that produced it
+                        tool_name = self.messages.tool_name(block.tool_use_id)
+                        break
+            
+            if tool_data:
+                break
         
         # Case 3: Generate a contextual response based on tool data
         if tool_data:
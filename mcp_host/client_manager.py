@@ -1,90 +1,547 @@
+import os
+import json
 import asyncio
 import logging
-from typing import Dict, List, Any
+import time
+from typing import Dict, List, Any, Optional
 
 from .config import ServerConfig
 from .sse_client import SSEClient
 from .stdio_client import StdioClient
+from .tool_index import ToolIndex
+from .tool_cache import ToolResultCache, make_call_key, is_error_result
 
 logger = logging.getLogger("mcp-host")
 
+DEFAULT_TOOL_SNAPSHOT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "mcp-host", "tool_snapshot.json")
+TOOL_RETRY_INITIAL_DELAY = 5.0  # seconds before re-listing tools of a server that missed its deadline
+TOOL_RETRY_MAX_DELAY = 300.0    # seconds, cap for the doubling retry delay
+STARTUP_GRACE_PERIOD = 2.0      # seconds to wait for the other servers once one is up
+
 class MCPClientManager:
     """Manage multiple MCP clients."""
     
-    def __init__(self, server_configs: Dict[str, ServerConfig]):
+    def __init__(self, server_configs: Dict[str, ServerConfig], snapshot_path: Optional[str] = None):
         self.server_configs = server_configs
+        self.snapshot_path = snapshot_path  # On-disk tool catalog snapshot, None to disable
         self.clients = {}
         self.cached_tools = None
+        self.server_tools: Dict[str, List[Dict[str, Any]]] = {}  # Last known namespaced tools per server
+        self.catalog_version = 0  # Bumped whenever the combined tool catalog changes
+        self._tools_generation: Dict[str, int] = {}  # Client generation each server's tools were listed from
+        self._stale_servers = set()  # Servers that announced a tool list change
+        self._tool_retry_tasks: Dict[str, asyncio.Task] = {}  # Background re-listing of servers whose listing failed
+        self._catalog_lock = asyncio.Lock()
+        self._catalog_dirty = False  # Set when the set of servers contributing tools changes
+        self._tool_index: Optional[ToolIndex] = None
+        self._tool_index_version = None  # Catalog version the tool index was built from
+        self.startup_report: Dict[str, Dict[str, Any]] = {}  # Per-server startup status and timing
+        self._startup_tasks: Dict[str, asyncio.Task] = {}
+        self._init_task = None
+        self._connect_locks: Dict[str, asyncio.Lock] = {}  # Serialise on-demand starts of lazy servers
+        self._last_used: Dict[str, float] = {}  # Monotonic time of each server's last tool call
+        self._active_calls: Dict[str, int] = {}  # Tool calls currently running per server
+        self._call_semaphores: Dict[str, asyncio.Semaphore] = {
+            name: asyncio.Semaphore(max(1, config.max_concurrent_calls))
+            for name, config in server_configs.items()
+        }
+        self._reaper_task = None
+        self.result_caches: Dict[str, ToolResultCache] = {
+            name: ToolResultCache(config.result_cache.max_entries)
+            for name, config in server_configs.items()
+            if config.result_cache
+        }
+        self._inflight: Dict[str, asyncio.Task] = {}  # Running tool calls keyed by tool name and canonical arguments
+        self._cleanup_tasks = set()  # Shutdowns of servers that failed to start, run off the startup path
         
     async def initialize_clients(self):
-        """Initialize all configured MCP clients."""
-        for name, config in self.server_configs.items():
-            from .mcpclient import MCPClient
-            client = MCPClient(name, config)
-            success = await client.initialize()
-            if success:
-                self.clients[name] = client
+        """Initialize all configured MCP clients concurrently.
+        
+        Returns once a server is up and the others have had a short grace
+        period, or once every server has finished trying. Servers still
+        starting then finish in the background, and tool calls to them wait
+        for their startup, so a slow or hung server doesn't hold up the host.
+        """
+        start_time = time.perf_counter()
+        pending = set(self._create_startup_tasks().values())
+        while pending and not self.clients:
+            _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        if pending:
+            _, pending = await asyncio.wait(pending, timeout=STARTUP_GRACE_PERIOD)
+        
+        logger.info(f"Initialized {len(self.clients)} MCP clients in {time.perf_counter() - start_time:.2f}s")
+        if pending:
+            logger.info(f"Still starting in the background: {', '.join(self.starting_servers())}")
+        
+        # Build the initial tool catalog so the first prompt doesn't pay for it,
+        # this also revalidates any tools seeded from the snapshot
+        await self.get_all_tools()
         
-        logger.info(f"Initialized {len(self.clients)} MCP clients")
+        if self._reaper_task is None and any(
+            config.lazy and config.idle_timeout for config in self.server_configs.values()
+        ):
+            self._reaper_task = asyncio.create_task(self._reap_idle_clients())
         return len(self.clients) > 0
+    
+    async def _start_client(self, name: str, config: ServerConfig):
+        """Start a single client within its startup deadline and record the outcome."""
+        from .mcpclient import MCPClient
+        client = MCPClient(name, config)
+        client.notification_handler = self._handle_notification
+        start_time = time.perf_counter()
+        error = None
+        
+        try:
+            success = await asyncio.wait_for(client.initialize(), timeout=config.startup_timeout)
+            status = "ok" if success else "failed"
+        except asyncio.TimeoutError:
+            success = False
+            status = "timeout"
+            error = f"no response within {config.startup_timeout:.1f}s"
+            logger.error(f"Server {name} did not start within {config.startup_timeout:.1f}s")
+        except asyncio.CancelledError:
+            await client.shutdown()
+            raise
+        except Exception as e:
+            success = False
+            status = "failed"
+            error = str(e)
+            logger.error(f"Failed to start server {name}: {str(e)}")
+        
+        elapsed = time.perf_counter() - start_time
+        self.startup_report[name] = {"status": status, "elapsed": elapsed, "error": error}
+        logger.info(f"Server {name} startup {status} after {elapsed:.2f}s")
+        
+        if success:
+            self.clients[name] = client
+            self._last_used[name] = time.monotonic()
+            # A fresh connection always gets its tools re-listed
+            self._tools_generation.pop(name, None)
+        else:
+            # A hung server can take seconds to stop, don't hold up the startup on it
+            self._shutdown_in_background(client)
+        self._catalog_dirty = True
+    
+    def _shutdown_in_background(self, client):
+        """Shut down a client without waiting for it, shutdown_all waits for what is left."""
+        task = asyncio.create_task(client.shutdown())
+        self._cleanup_tasks.add(task)
+        task.add_done_callback(self._cleanup_tasks.discard)
+    
+    def _create_startup_tasks(self) -> Dict[str, asyncio.Task]:
+        """Create one startup task per configured server, once.
+        
+        Lazy servers whose tools are already known are left for their
+        first tool call.
+        """
+        if not self._startup_tasks:
+            self._startup_tasks = {
+                name: asyncio.create_task(self._start_client(name, config))
+                for name, config in self.server_configs.items()
+                if not (config.lazy and name in self.server_tools)
+            }
+        return self._startup_tasks
+        
+    def starting_servers(self) -> List[str]:
+        """Get the servers whose startup is still running."""
+        return [name for name, task in self._startup_tasks.items() if not task.done()]
+    
+    async def _ensure_client(self, server_name: str):
+        """Return a connected client for the server, starting it if needed."""
+        # The server may still be starting in the background
+        startup_task = self._startup_tasks.get(server_name)
+        if server_name not in self.clients and startup_task and not startup_task.done():
+            logger.info(f"Waiting for server {server_name} to finish starting")
+            await asyncio.shield(startup_task)
+        
+        client = self.clients.get(server_name)
+        if client:
+            return client
+        
+        config = self.server_configs.get(server_name)
+        if not config or not config.lazy:
+            return None
+        
+        lock = self._connect_locks.setdefault(server_name, asyncio.Lock())
+        async with lock:
+            if server_name not in self.clients:
+                logger.info(f"Connecting lazy server {server_name} on first use")
+                await self._start_client(server_name, config)
+        return self.clients.get(server_name)
+    
+    async def _reap_idle_clients(self):
+        """Shut down lazy servers that have been idle longer than their idle timeout."""
+        timeouts = [
+            config.idle_timeout for config in self.server_configs.values()
+            if config.lazy and config.idle_timeout
+        ]
+        interval = max(1.0, min(timeouts) / 2)
+        
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for name, client in list(self.clients.items()):
+                config = client.config
+                if not config.lazy or not config.idle_timeout or self._active_calls.get(name):
+                    continue
+                idle_for = now - self._last_used.get(name, now)
+                if idle_for < config.idle_timeout:
+                    continue
+                
+                async with self._connect_locks.setdefault(name, asyncio.Lock()):
+                    if self.clients.get(name) is not client or self._active_calls.get(name):
+                        continue
+                    logger.info(f"Shutting down lazy server {name} after {idle_for:.0f}s idle")
+                    del self.clients[name]
+                    try:
+                        await client.shutdown()
+                    except Exception as e:
+                        logger.error(f"Error shutting down idle server {name}: {str(e)}")
+    
+    def start_background_initialization(self):
+        """Start all clients in the background, serving tools from the snapshot meanwhile."""
+        if self._init_task is None:
+            # Create the per-server tasks now so call_tool can wait on them right away
+            self._create_startup_tasks()
+            self._init_task = asyncio.create_task(self.initialize_clients())
+        return self._init_task
+    
+    def load_tool_snapshot(self) -> bool:
+        """Seed the tool catalog from the on-disk snapshot.
+        
+        Returns:
+            True if every configured server had a snapshot entry
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable tool snapshot {self.snapshot_path}: {str(e)}")
+            return False
+        
+        loaded = 0
+        for name, config in self.server_configs.items():
+            entry = snapshot.get(config.cache_key())
+            if not entry:
+                continue
+            self.server_tools[name] = self._namespace_tools(name, entry.get("tools", []))
+            loaded += 1
+        
+        if loaded:
+            self.cached_tools = self._combine_tools()
+            self.catalog_version += 1
+            logger.info(f"Loaded {len(self.cached_tools)} tools for {loaded} server(s) from snapshot")
+        return loaded == len(self.server_configs)
+    
+    def _save_tool_snapshot(self):
+        """Write the live tool lists of connected servers to the snapshot file."""
+        if not self.snapshot_path:
+            return
+        
+        try:
+            snapshot = {}
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r") as f:
+                    snapshot = json.load(f)
+        except Exception:
+            snapshot = {}
+        
+        for name in self.clients:
+            if name not in self._tools_generation:
+                continue  # Never listed live, nothing new to record
+            prefix = f"{name}__"
+            snapshot[self.server_configs[name].cache_key()] = {
+                "server": name,
+                "saved_at": time.time(),
+                "tools": [
+                    dict(tool, name=tool["name"][len(prefix):])
+                    for tool in self.server_tools.get(name, [])
+                ]
+            }
+        
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"Failed to write tool snapshot {self.snapshot_path}: {str(e)}")
+        
+    def _handle_notification(self, server_name: str, message: Dict[str, Any]):
+        """React to notifications from any server."""
+        if message.get("method") == "notifications/tools/list_changed":
+            logger.info(f"Tool list changed on {server_name}, refreshing on next use")
+            self._stale_servers.add(server_name)
+    
+    def _needs_tool_refresh(self, name: str, client) -> bool:
+        """Check whether a server's cached tools are missing or out of date."""
+        retry_task = self._tool_retry_tasks.get(name)
+        if retry_task and not retry_task.done():
+            return False  # Being retried in the background, keep the last known tools meanwhile
+        return (
+            name in self._stale_servers
+            or name not in self.server_tools
+            or self._tools_generation.get(name) != client.generation  # Reconnected since last listing
+        )
         
-    async def get_all_tools(self, skip_refresh: bool = False) -> List[Dict[str, Any]]:
+    async def get_all_tools(self, force_refresh: bool = False) -> List[Dict[str, Any]]:
         """Get all tools from all servers with namespaced names.
         
+        The catalog is cached and only re-listed for servers that are new,
+        have reconnected or sent notifications/tools/list_changed.
+        
         Args:
-            skip_refresh: If True, return cached tools instead of refreshing from servers
+            force_refresh: If True, re-list tools from every server
         """
-        # Return cached tools if requested and available
-        if skip_refresh and self.cached_tools is not None:
-            logger.debug(f"Using cached tools ({len(self.cached_tools)})")
-            return self.cached_tools
+        async with self._catalog_lock:
+            to_refresh = {
+                name: client for name, client in self.clients.items()
+                if force_refresh or self._needs_tool_refresh(name, client)
+            }
+            
+            if not to_refresh and self.cached_tools is not None and not self._catalog_dirty:
+                logger.debug(f"Using cached tools ({len(self.cached_tools)}, version {self.catalog_version})")
+                return self.cached_tools
             
-        all_tools = []
+            # Fan out to the affected servers at once, each bounded by its own deadline
+            await asyncio.gather(*(
+                self._fetch_server_tools(name, client)
+                for name, client in to_refresh.items()
+            ))
+            all_tools = self._combine_tools()
+            self._catalog_dirty = False
+            
+            if all_tools != self.cached_tools:
+                self.catalog_version += 1
+                self._save_tool_snapshot()
+            logger.info(f"Collected {len(all_tools)} tools from all servers (catalog version {self.catalog_version})")
+            
+            self.cached_tools = all_tools
+            return all_tools
         
-        for name, client in self.clients.items():
-            try:
-                tools = await client.list_tools()
-                for tool in tools:
-                    # Namespace the tool name with the server name
-                    tool_with_namespace = tool.copy()
-                    tool_with_namespace["name"] = f"{name}__{tool['name']}"
-                    all_tools.append(tool_with_namespace)
-                logger.info(f"Got {len(tools)} tools from {name}")
-            except Exception as e:
-                logger.error(f"Failed to get tools from {name}: {str(e)}")
-                # Continue with other clients instead of failing entirely
+    async def select_tools(
+        self, 
+        query: str, 
+        top_k: int, 
+        always_include: List[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Get the tools most relevant to a query from the local BM25 index.
+        
+        The index is rebuilt only when the catalog version changes.
+        
+        Args:
+            query: Text to rank the tools against, usually the user's prompt
+            top_k: Maximum number of ranked tools to return
+            always_include: Tool names, namespaced or not, returned regardless of rank
+        """
+        tools = await self.get_all_tools()
+        if len(tools) <= top_k:
+            return tools
         
-        logger.info(f"Collected {len(all_tools)} tools from all servers")
+        if self._tool_index is None or self._tool_index_version != self.catalog_version:
+            self._tool_index = ToolIndex(tools)
+            self._tool_index_version = self.catalog_version
+            logger.debug(f"Built tool index over {len(tools)} tools (catalog version {self.catalog_version})")
         
-        # Cache the tools for future use
-        self.cached_tools = all_tools
+        return self._tool_index.search(query, top_k, always_include or [])
         
-        return all_tools
+    def _combine_tools(self) -> List[Dict[str, Any]]:
+        """Combine per-server tools into one catalog in config order.
+        
+        Servers still starting up, and lazy servers that are not connected,
+        contribute their last known tools; servers that failed to start
+        contribute nothing.
+        """
+        return [
+            tool for name in self.server_configs
+            if name in self.clients or self.startup_report.get(name, {}).get("status", "ok") == "ok"
+            for tool in self.server_tools.get(name, [])
+        ]
+    
+    def _namespace_tools(self, name: str, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Prefix tool names with the server name."""
+        namespaced_tools = []
+        for tool in tools:
+            # Namespace the tool name with the server name
+            tool_with_namespace = tool.copy()
+            tool_with_namespace["name"] = f"{name}__{tool['name']}"
+            namespaced_tools.append(tool_with_namespace)
+        return namespaced_tools
+        
+    async def _fetch_server_tools(self, name: str, client) -> List[Dict[str, Any]]:
+        """Fetch one server's tools, falling back to its last known tools on timeout or error.
+        
+        A server that fails is retried in the background, so later turns
+        don't wait on it again.
+        """
+        tools = await self._list_server_tools(name, client)
+        if tools is None:
+            self._schedule_tool_retry(name, client)
+            return self.server_tools.get(name, [])
+        
+        retry_task = self._tool_retry_tasks.pop(name, None)
+        if retry_task:
+            retry_task.cancel()  # Listed inline by a forced refresh
+        return tools
+        
+    async def _list_server_tools(self, name: str, client) -> Optional[List[Dict[str, Any]]]:
+        """List one server's tools within its deadline and store them, None on timeout or error."""
+        timeout = client.config.list_tools_timeout
+        generation = client.generation
+        # Clear the flag first so a change announced mid-fetch is not lost
+        self._stale_servers.discard(name)
+        try:
+            tools = await asyncio.wait_for(client.list_tools(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Server {name} did not list tools within {timeout:.1f}s, using last known tools")
+            return None
+        except Exception as e:
+            logger.error(f"Failed to get tools from {name}: {str(e)}")
+            return None
+        
+        namespaced_tools = self._namespace_tools(name, tools)
+        logger.info(f"Got {len(tools)} tools from {name}")
+        
+        self.server_tools[name] = namespaced_tools
+        self._tools_generation[name] = generation
+        return namespaced_tools
+        
+    def _schedule_tool_retry(self, name: str, client):
+        """Start re-listing a server's tools in the background, once."""
+        retry_task = self._tool_retry_tasks.get(name)
+        if retry_task is None or retry_task.done():
+            self._tool_retry_tasks[name] = asyncio.create_task(self._retry_tool_listing(name, client))
+            
+    async def _retry_tool_listing(self, name: str, client):
+        """Re-list a server's tools with a doubling delay until it answers or goes away."""
+        delay = TOOL_RETRY_INITIAL_DELAY
+        try:
+            while self.clients.get(name) is client:
+                await asyncio.sleep(delay)
+                if self.clients.get(name) is not client:
+                    break
+                if await self._list_server_tools(name, client) is not None:
+                    # The next get_all_tools recombines the catalog without waiting on anyone
+                    self._catalog_dirty = True
+                    break
+                delay = min(delay * 2, TOOL_RETRY_MAX_DELAY)
+        finally:
+            if self._tool_retry_tasks.get(name) is asyncio.current_task():
+                del self._tool_retry_tasks[name]
         
     async def call_tool(self, namespaced_tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Call a tool by its namespaced name."""
+        """Call a tool by its namespaced name.
+        
+        Identical calls to a read-only or idempotent tool made while one is
+        already running share its result instead of going to the server again.
+        """
         try:
             server_name, tool_name = namespaced_tool_name.split("__", 1)
+            key = make_call_key(namespaced_tool_name, arguments)
+            
+            # Serve repeated calls from the result cache if the tool opted in
+            cache = self.result_caches.get(server_name)
+            ttl = self.server_configs[server_name].result_cache.ttl_for(tool_name) if cache is not None else None
+            if ttl:
+                cached = cache.get(key)
+                if cached is not None:
+                    logger.debug(f"Result cache hit for {namespaced_tool_name}")
+                    return cached
             
-            client = self.clients.get(server_name)
-            if not client:
-                return {"error": f"Server {server_name} not found"}
+            if not self._can_coalesce(server_name, namespaced_tool_name):
+                return await self._call_and_cache(server_name, tool_name, arguments, key, ttl)
             
-            return await client.call_tool(tool_name, arguments)
+            # Follow an identical call that is already running, or lead a new one
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.create_task(self._call_and_cache(server_name, tool_name, arguments, key, ttl))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                logger.debug(f"Joining in-flight call to {namespaced_tool_name}")
+            
+            # Shielded so a caller giving up doesn't cancel the call for the others
+            return await asyncio.shield(task)
         except ValueError:
             return {"error": f"Invalid tool name format: {namespaced_tool_name}"}
         except Exception as e:
             logger.error(f"Error calling tool {namespaced_tool_name}: {str(e)}")
             return {"error": str(e)}
             
+    def _can_coalesce(self, server_name: str, namespaced_tool_name: str) -> bool:
+        """Check whether identical concurrent calls to a tool may share one request.
+        
+        The server's coalesceCalls setting decides if present, otherwise only
+        tools annotated as read-only or idempotent are coalesced.
+        """
+        config = self.server_configs.get(server_name)
+        if config is not None and config.coalesce_calls is not None:
+            return config.coalesce_calls
+            
+        tool = next((tool for tool in self.server_tools.get(server_name, []) if tool["name"] == namespaced_tool_name), None)
+        annotations = (tool or {}).get("annotations") or {}
+        return bool(annotations.get("readOnlyHint") or annotations.get("idempotentHint"))
+            
+    async def _call_and_cache(
+        self, 
+        server_name: str, 
+        tool_name: str, 
+        arguments: Dict[str, Any], 
+        key: str, 
+        ttl: Optional[float]
+    ) -> Dict[str, Any]:
+        """Call a tool on its server and cache the result if the tool opted in."""
+        result = await self._call_server_tool(server_name, tool_name, arguments)
+        
+        # Errors are never cached, the next call should try again
+        if ttl and not is_error_result(result):
+            self.result_caches[server_name].put(key, result, ttl)
+        return result
+            
+    async def _call_server_tool(self, server_name: str, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a tool on its server, starting the server first if needed."""
+        client = await self._ensure_client(server_name)
+        if not client:
+            return {"error": f"Server {server_name} not found"}
+        
+        self._active_calls[server_name] = self._active_calls.get(server_name, 0) + 1
+        try:
+            async with self._call_semaphores[server_name]:
+                return await client.call_tool(tool_name, arguments)
+        finally:
+            self._active_calls[server_name] -= 1
+            self._last_used[server_name] = time.monotonic()
+            
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Get the result cache counters of each server that has a cache."""
+        return {name: cache.stats() for name, cache in self.result_caches.items()}
+            
     async def shutdown_all(self):
         """Shut down all MCP clients."""
         logger.info("Shutting down all MCP clients...")
         
+        # Stop any startup still running in the background
+        startup_tasks = [
+            task for task in [
+                self._init_task, self._reaper_task,
+                *self._startup_tasks.values(), *self._tool_retry_tasks.values()
+            ]
+            if task and not task.done()
+        ]
+        for task in startup_tasks:
+            task.cancel()
+        if startup_tasks:
+            await asyncio.gather(*startup_tasks, return_exceptions=True)
+        
         # Make a copy of clients to avoid modification during iteration
         clients_to_shutdown = list(self.clients.items())
         
-        shutdown_tasks = []
+        # Include shutdowns of failed servers still running in the background
+        shutdown_tasks = list(self._cleanup_tasks)
         for name, client in clients_to_shutdown:
             try:
                 task = asyncio.create_task(client.shutdown())
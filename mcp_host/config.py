@@ -1,20 +1,58 @@
 import os
 import json
 import re
+import hashlib
 import logging
 from typing import Dict, List, Tuple, Optional, Any
 from dataclasses import dataclass, field
 
 logger = logging.getLogger("mcp-host")
 
+@dataclass
+class ResultCacheConfig:
+    """Memoization settings for one server's tool results."""
+    ttl: float = 60.0  # Seconds a result stays cached
+    max_entries: int = 256  # Results kept before the least recently used is evicted
+    tools: Optional[Dict[str, float]] = None  # Per-tool TTLs, only these tools are cached; None caches every tool
+    
+    def ttl_for(self, tool_name: str) -> Optional[float]:
+        """Return how long a tool's results may be cached, or None if they aren't."""
+        if self.tools is None:
+            return self.ttl
+        return self.tools.get(tool_name)
+
 @dataclass
 class ServerConfig:
     """Configuration for an MCP server."""
     type: str = "stdio"  # Default to stdio for backward compatibility
-    command: Optional[str] = None  # Required for stdio, not for SSE
+    command: Optional[str] = None  # Required for stdio and ssh, not for SSE or streamable-http
     args: List[str] = field(default_factory=list)
     env: Dict[str, str] = field(default_factory=dict)
-    url: Optional[str] = None  # Required for SSE, not for stdio
+    url: Optional[str] = None  # Required for SSE and streamable-http, not for stdio
+    host: Optional[str] = None  # Remote host for ssh
+    port: int = 22  # SSH port
+    username: Optional[str] = None  # SSH user, defaults to the local user
+    client_keys: List[str] = field(default_factory=list)  # SSH private key files, empty to use the agent and default keys
+    known_hosts: Optional[str] = None  # Known hosts file, defaults to ~/.ssh/known_hosts
+    startup_timeout: float = 30.0  # Seconds allowed for spawn/connect plus the initialize handshake
+    list_tools_timeout: float = 5.0  # Seconds to wait for tools/list before using the last known tools
+    lazy: bool = False  # Connect on first tool call instead of at startup
+    idle_timeout: Optional[float] = None  # Seconds before an idle lazy server is shut down, None to keep it
+    max_concurrent_calls: int = 4  # Tool calls allowed in flight against this server at once
+    result_cache: Optional[ResultCacheConfig] = None  # Opt-in tool result memoization, None to disable
+    coalesce_calls: Optional[bool] = None  # Identical concurrent tool calls share one request, None for read-only/idempotent tools only
+    
+    def cache_key(self) -> str:
+        """Return a stable hash of the settings that identify the server being launched."""
+        identity = json.dumps({
+            "type": self.type,
+            "command": self.command,
+            "args": self.args,
+            "env": self.env,
+            "url": self.url,
+            **({"host": self.host, "port": self.port, "username": self.username} if self.type == "ssh" else {})
+        }, sort_keys=True)
+        return hashlib.sha256(identity.encode()).hexdigest()
 
 @dataclass
 class LLMProviderConfig:
@@ -63,9 +101,13 @@ class ConfigLoader:
                     if "command" not in server_config:
                         logger.error(f"Server '{name}' is missing required 'command' for stdio transport")
                         continue
-                elif transport_type == "sse":
+                elif transport_type == "ssh":
+                    if "command" not in server_config or "host" not in server_config:
+                        logger.error(f"Server '{name}' needs both 'host' and 'command' for ssh transport")
+                        continue
+                elif transport_type in ("sse", "streamable-http"):
                     if "url" not in server_config:
-                        logger.error(f"Server '{name}' is missing required 'url' for SSE transport")
+                        logger.error(f"Server '{name}' is missing required 'url' for {transport_type} transport")
                         continue
                     
                     url = server_config["url"]
@@ -76,12 +118,35 @@ class ConfigLoader:
                     logger.error(f"Server '{name}' has unsupported transport type: {transport_type}")
                     continue
                 
+                # Parse the optional tool result cache
+                result_cache = None
+                cache_config = server_config.get("resultCache")
+                if cache_config:
+                    tool_ttls = cache_config.get("tools")
+                    result_cache = ResultCacheConfig(
+                        ttl=float(cache_config.get("ttl", 60.0)),
+                        max_entries=int(cache_config.get("maxEntries", 256)),
+                        tools={tool: float(ttl) for tool, ttl in tool_ttls.items()} if tool_ttls is not None else None
+                    )
+                
                 servers[name] = ServerConfig(
                     type=transport_type,
                     command=server_config.get("command"),
                     args=server_config.get("args", []),
                     env=server_config.get("env", {}),
-                    url=server_config.get("url")
+                    url=server_config.get("url"),
+                    host=server_config.get("host"),
+                    port=int(server_config.get("port", 22)),
+                    username=server_config.get("username"),
+                    client_keys=[os.path.expanduser(key) for key in server_config.get("clientKeys", [])],
+                    known_hosts=os.path.expanduser(server_config["knownHosts"]) if server_config.get("knownHosts") else None,
+                    startup_timeout=float(server_config.get("startupTimeout", 30.0)),
+                    list_tools_timeout=float(server_config.get("listToolsTimeout", 5.0)),
+                    lazy=bool(server_config.get("lazy", False)),
+                    idle_timeout=float(server_config["idleTimeout"]) if server_config.get("idleTimeout") else None,
+                    max_concurrent_calls=int(server_config.get("maxConcurrentCalls", 4)),
+                    result_cache=result_cache,
+                    coalesce_calls=bool(server_config["coalesceCalls"]) if "coalesceCalls" in server_config else None
                 )
             
             # Load LLM provider config
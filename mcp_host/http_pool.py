@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from typing import Dict, Any, Optional
+import aiohttp
+
+logger = logging.getLogger("mcp-host")
+
+# Connection pool tuning, shared by every HTTP user in the host
+CONNECTION_LIMIT = 100         # connections across all hosts
+CONNECTION_LIMIT_PER_HOST = 32  # connections per host, each SSE stream holds one for its lifetime
+KEEPALIVE_TIMEOUT = 60         # seconds an idle connection is kept open
+DNS_CACHE_TTL = 300            # seconds
+
+class HTTPPool:
+    """One aiohttp session and connector shared by all SSE clients and the LLM provider.
+    
+    Users acquire the session and release it when done; it is opened by the
+    first acquire and closed when the last user releases it, so keep-alive
+    connections to a host are reused across servers and requests.
+    """
+    
+    def __init__(self):
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.users = 0
+        self._stats = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "queued": 0  # Requests that had to wait for a free connection
+        }
+        
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Build the trace hooks that count requests and connection reuse."""
+        trace_config = aiohttp.TraceConfig()
+        
+        def counter(name):
+            async def count(session, context, params):
+                self._stats[name] += 1
+            return count
+            
+        trace_config.on_request_start.append(counter("requests"))
+        trace_config.on_connection_create_end.append(counter("connections_created"))
+        trace_config.on_connection_reuseconn.append(counter("connections_reused"))
+        trace_config.on_connection_queued_start.append(counter("queued"))
+        return trace_config
+        
+    def acquire(self) -> aiohttp.ClientSession:
+        """Get the shared session, opening it if needed. Pair every call with release()."""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTION_LIMIT,
+                limit_per_host=CONNECTION_LIMIT_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=DNS_CACHE_TTL
+            )
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+            logger.debug("Opened shared HTTP connection pool")
+        self.users += 1
+        return self.session
+        
+    async def release(self):
+        """Give up one use of the shared session, closing it after the last user."""
+        self.users = max(0, self.users - 1)
+        if self.users or self.session is None:
+            return
+            
+        session, self.session = self.session, None
+        try:
+            await asyncio.wait_for(session.close(), timeout=2.0)
+            logger.debug("Closed shared HTTP connection pool")
+        except asyncio.TimeoutError:
+            logger.warning("Timeout closing shared HTTP connection pool")
+        except Exception as e:
+            logger.debug(f"Error closing shared HTTP connection pool (non-critical): {str(e)}")
+            
+    def stats(self) -> Dict[str, Any]:
+        """Get request and connection counters for the pool."""
+        return {
+            "open": self.session is not None and not self.session.closed,
+            "users": self.users,
+            **self._stats
+        }
+
+# The host-wide pool
+http_pool = HTTPPool()
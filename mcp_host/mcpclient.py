@@ -1,9 +1,12 @@
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 
 from .config import ServerConfig
 from .sse_client import SSEClient
+from .ssh_client import SSHClient
+from .ssh_pool import SSHTarget
 from .stdio_client import StdioClient
+from .streamable_http_client import StreamableHTTPClient
 
 logger = logging.getLogger("mcp-host")
 
@@ -16,6 +19,8 @@ class MCPClient:
         self.transport = None
         self.initialized = False
         self.next_id = 1
+        self.generation = 0  # Incremented on every successful (re)initialization
+        self.notification_handler: Optional[Callable[[str, Dict[str, Any]], None]] = None
     
     async def initialize(self):
         """Initialize the MCP connection."""
@@ -31,6 +36,24 @@ class MCPClient:
                 args=self.config.args or [],
                 env=self.config.env or {}
             )
+        elif self.config.type == "ssh":
+            if not self.config.command or not self.config.host:
+                logger.error(f"Server {self.name} needs both 'host' and 'command' for ssh transport")
+                return False
+                
+            self.transport = SSHClient(
+                name=self.name,
+                target=SSHTarget(
+                    host=self.config.host,
+                    port=self.config.port,
+                    username=self.config.username,
+                    client_keys=tuple(self.config.client_keys),
+                    known_hosts=self.config.known_hosts
+                ),
+                command=self.config.command,
+                args=self.config.args or [],
+                env=self.config.env or {}
+            )
         elif self.config.type == "sse":
             if not self.config.url:
                 logger.error(f"Server {self.name} is missing required 'url' for SSE transport")
@@ -40,15 +63,38 @@ class MCPClient:
                 name=self.name,
                 url=self.config.url
             )
+            # A reconnect that lands on a new server session needs a fresh handshake
+            self.transport.session_lost_handler = self._handshake
+        elif self.config.type == "streamable-http":
+            if not self.config.url:
+                logger.error(f"Server {self.name} is missing required 'url' for Streamable HTTP transport")
+                return False
+            
+            self.transport = StreamableHTTPClient(
+                name=self.name,
+                url=self.config.url
+            )
+            # The server may expire our session, which also needs a fresh handshake
+            self.transport.session_lost_handler = self._handshake
         else:
             logger.error(f"Unsupported transport type for server {self.name}: {self.config.type}")
             return False
         
+        self.transport.notification_handler = self._handle_notification
+        
         # Connect using the selected transport
         if not await self.transport.connect():
+            # Let the transport free whatever it set up before failing
+            await self.shutdown()
             return False
         
-        # Initialize the MCP connection
+        if not await self._handshake():
+            await self.shutdown()
+            return False
+        return True
+    
+    async def _handshake(self) -> bool:
+        """Run the MCP initialize handshake over the connected transport."""
         init_request = {
             "jsonrpc": "2.0",
             "id": self._get_next_id(),
@@ -80,17 +126,24 @@ class MCPClient:
                     logger.error(f"Failed to send initialized notification to {self.name}: {str(e)}")
                     
                 self.initialized = True
+                self.generation += 1
                 logger.info(f"Initialized MCP server: {self.name}")
                 return True
             else:
                 logger.error(f"Failed to initialize MCP server {self.name}: Invalid response")
-                await self.shutdown()
                 return False
         except Exception as e:
             logger.error(f"Failed to initialize MCP server {self.name}: {str(e)}")
-            await self.shutdown()
             return False
     
+    def _handle_notification(self, message: Dict[str, Any]):
+        """Forward a server notification, tagged with this server's name."""
+        if self.notification_handler:
+            try:
+                self.notification_handler(self.name, message)
+            except Exception as e:
+                logger.error(f"Error handling notification from {self.name}: {str(e)}")
+    
     def _get_next_id(self) -> int:
         """Get the next request ID."""
         request_id = self.next_id
@@ -2,11 +2,15 @@ import os
 import json
 import asyncio
 import logging
+import time
 import uuid
+import weakref
 import aiohttp
-from typing import List, Dict, Any, Optional, Union
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, Union, AsyncIterator
 
-from .chat_session import Message, ContentBlock
+from .chat_session import Message, ContentBlock, MessageStore, StreamEvent
+from .http_pool import http_pool
 
 logger = logging.getLogger("mcp-host")
 
@@ -15,6 +19,30 @@ MAX_RETRIES = 3
 INITIAL_BACKOFF = 1  # seconds
 MAX_BACKOFF = 30     # seconds
 
+
+# Context window accounting
+DEFAULT_NUM_CTX = 4096          # tokens, sent explicitly when neither the config nor the model sets num_ctx
+INITIAL_CHARS_PER_TOKEN = 4.0   # starting estimate, calibrated from prompt_eval_count
+MESSAGE_OVERHEAD_TOKENS = 4     # role markers and separators per message
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+@dataclass
+class _FormattedHistory:
+    """Ollama-formatted, JSON-encoded history of one MessageStore."""
+    formatted: int = 0  # Store messages formatted so far, counted from the first one ever appended
+    fragments: List[bytes] = field(default_factory=list)  # Encoded Ollama messages, in order
+    counts: List[int] = field(default_factory=list)  # Fragments produced by each formatted store message
+    chars: List[int] = field(default_factory=list)  # Content characters of each fragment
+
+@dataclass
+class _Payload:
+    """An encoded /api/chat request body plus the sizes used for calibration."""
+    body: bytes
+    message_count: int
+    message_chars: int
+    tools_chars: int
+
 class OllamaProvider:
     """Communicate with the Ollama API."""
     
@@ -27,6 +55,7 @@ class OllamaProvider:
         self.model = model
         self.parameters = parameters or {}
         self.url = url.rstrip('/')
+        self.session = None  # Shared pooled HTTP session, acquired by connect()
         logger.info(f"Initialized Ollama provider with model: {model} at {url}")
         
         # Set default parameters if not provided
@@ -34,219 +63,522 @@ class OllamaProvider:
             self.parameters["temperature"] = 0.7
         if "num_predict" not in self.parameters:
             self.parameters["num_predict"] = 1024
+        
+        self.model_num_ctx: Optional[int] = None  # num_ctx from the model's Modelfile, read by connect()
+        self.model_max_ctx: Optional[int] = None  # Context length the model was trained for, read by connect()
+        self.chars_per_token = INITIAL_CHARS_PER_TOKEN
+        self.last_prompt_eval_count = None
+        
+        # Formatted history per session, so each call only formats newly appended messages
+        self._history_cache: "weakref.WeakKeyDictionary[MessageStore, _FormattedHistory]" = weakref.WeakKeyDictionary()
+        
+        # Encoded tool definitions for one catalog version, reused until the catalog changes
+        self._tools_version = None
+        self._tool_fragments: Dict[str, Tuple[bytes, int]] = {}  # Tool name -> (encoded definition, estimated chars)
+        self._tools_array: Optional[Tuple[Tuple[str, ...], bytes, int]] = None  # Last encoded tools array, keyed by tool names
+    
+    @property
+    def context_length(self) -> int:
+        """The context window Ollama runs the model with, in tokens.
+        
+        The configured num_ctx wins, then the model's own. Without either,
+        DEFAULT_NUM_CTX is sent, capped by what the model supports.
+        """
+        if "num_ctx" in self.parameters:
+            return int(self.parameters["num_ctx"])
+        if self.model_num_ctx:
+            return self.model_num_ctx
+        if self.model_max_ctx:
+            return min(DEFAULT_NUM_CTX, self.model_max_ctx)
+        return DEFAULT_NUM_CTX
+        
+    def _options(self) -> Dict[str, Any]:
+        """Ollama options for a request, with num_ctx set unless the model's own applies."""
+        if "num_ctx" in self.parameters or self.model_num_ctx:
+            return self.parameters
+        return {**self.parameters, "num_ctx": self.context_length}
+    
+    def estimate_message_tokens(self, message: Message) -> int:
+        """Estimate how many prompt tokens a message will use once formatted."""
+        return self.estimate_history_tokens(message.content_chars(), 1)
+        
+    def estimate_history_tokens(self, chars: int, message_count: int) -> int:
+        """Estimate the prompt tokens of message_count messages holding chars content characters."""
+        return int(chars / self.chars_per_token) + MESSAGE_OVERHEAD_TOKENS * message_count
+    
+    def estimate_tools_tokens(self, tools: List[Dict[str, Any]] = None, tools_version: Optional[int] = None) -> int:
+        """Estimate how many prompt tokens the tool definitions will use."""
+        if not tools or not self._supports_function_calling():
+            return 0
+        _, chars = self._encoded_tools(tools, tools_version)
+        return int(chars / self.chars_per_token)
+    
+    def prompt_token_budget(self, tools: List[Dict[str, Any]] = None, tools_version: Optional[int] = None) -> int:
+        """Tokens available for message history, after tools and the reply are reserved."""
+        reserved = int(self.parameters.get("num_predict", 0)) + self.estimate_tools_tokens(tools, tools_version)
+        return max(0, self.context_length - reserved)
+    
+    def _calibrate(self, payload: _Payload, prompt_eval_count: Optional[int]):
+        """Refine the chars-per-token estimate from the token count Ollama reported."""
+        if not prompt_eval_count:
+            return
+        chars = payload.message_chars + payload.tools_chars
+        tokens = prompt_eval_count - MESSAGE_OVERHEAD_TOKENS * payload.message_count
+        if tokens <= 0 or chars <= 0:
+            return
+        
+        # Ignore implausible samples, e.g. when Ollama reuses a cached prompt prefix
+        measured = chars / tokens
+        if not 1.0 <= measured <= 10.0:
+            return
+        self.chars_per_token = 0.7 * self.chars_per_token + 0.3 * measured
+        self.last_prompt_eval_count = prompt_eval_count
+        logger.debug(f"Prompt used {prompt_eval_count} tokens, estimate now {self.chars_per_token:.2f} chars/token")
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared pooled HTTP session, acquiring it if needed."""
+        if self.session is None:
+            self.session = http_pool.acquire()
+        return self.session
     
     async def connect(self) -> bool:
-        """Establish connection to Ollama."""
+        """Acquire the pooled HTTP session and check that Ollama is reachable."""
         try:
-            async with aiohttp.ClientSession() as session:
-                # Check models endpoint as a simple ping
-                async with session.get(f"{self.url}/api/tags") as response:
-                    if response.status != 200:
-                        logger.error(f"Failed to connect to Ollama API: {response.status}")
-                        return False
-                    
-                    # Check if our model is available
-                    data = await response.json()
-                    models = [model.get("name") for model in data.get("models", [])]
-                    
-                    if not models:
-                        logger.warning("No models found in Ollama")
-                    elif self.model not in models:
-                        logger.warning(f"Model {self.model} not found in Ollama. " +
-                                     f"Available models: {', '.join(models)}")
-                    
-                    logger.info(f"Successfully connected to Ollama API")
-                    return True
+            session = self._get_session()
+            # Check models endpoint as a simple ping
+            async with session.get(f"{self.url}/api/tags") as response:
+                if response.status != 200:
+                    logger.error(f"Failed to connect to Ollama API: {response.status}")
+                    return False
+                
+                # Check if our model is available
+                data = await response.json()
+                models = [model.get("name") for model in data.get("models", [])]
+                
+                if not models:
+                    logger.warning("No models found in Ollama")
+                elif self.model not in models:
+                    logger.warning(f"Model {self.model} not found in Ollama. " +
+                                 f"Available models: {', '.join(models)}")
+                
+            await self._read_model_context()
+            logger.info(f"Successfully connected to Ollama API")
+            return True
         except Exception as e:
             logger.error(f"Error connecting to Ollama API: {str(e)}")
             return False
+            
+    async def _read_model_context(self):
+        """Read the model's num_ctx and trained context length from /api/show."""
+        try:
+            async with self._get_session().post(f"{self.url}/api/show", json={"model": self.model}) as response:
+                if response.status != 200:
+                    logger.debug(f"Could not show model {self.model}: {response.status}")
+                    return
+                data = await response.json()
+        except Exception as e:
+            logger.debug(f"Could not show model {self.model}: {str(e)}")
+            return
+            
+        # Modelfile parameters come as lines of "name value"
+        for line in (data.get("parameters") or "").splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[0] == "num_ctx" and parts[1].isdigit():
+                self.model_num_ctx = int(parts[1])
+        for key, value in (data.get("model_info") or {}).items():
+            if key.endswith(".context_length") and isinstance(value, int):
+                self.model_max_ctx = value
+        logger.info(f"Model {self.model} context window: {self.context_length} tokens")
     
     async def disconnect(self):
-        """Disconnect from Ollama."""
-        # Nothing to do for basic Ollama implementation
-        pass
+        """Release the pooled HTTP session."""
+        if self.session is not None:
+            self.session = None
+            await http_pool.release()
     
-    async def create_message(
+    def _format_message(self, msg: Message, find_tool_name) -> List[Dict[str, Any]]:
+        """Convert one Message into the Ollama messages it is sent as."""
+        # Skip empty messages
+        if not msg.content:
+            return []
+            
+        if msg.role == "user" or msg.role == "assistant":
+            # Get text content from the message
+            text_content = msg.get_text_content()
+            
+            if text_content:
+                return [{
+                    "role": msg.role,
+                    "content": text_content
+                }]
+                
+        elif msg.role == "tool":
+            # For tool responses, add as a tool role in Ollama
+            ollama_messages = []
+            for block in msg.content:
+                if block.type == "tool_result" and block.content:
+                    # Get tool content as text
+                    tool_content = ""
+                    if isinstance(block.content, list):
+                        for content_item in block.content:
+                            if isinstance(content_item, dict) and content_item.get("type") == "text":
+                                tool_content += content_item.get("text", "")
+                    elif isinstance(block.content, str):
+                        tool_content = block.content
+                        
+                    # Find the corresponding tool_call to get the name
+                    tool_name = find_tool_name(block.tool_use_id)
+                    
+                    # Add as tool message
+                    ollama_messages.append({
+                        "role": "tool", 
+                        "content": tool_content,
+                        "name": tool_name or "unknown_tool"
+                    })
+            return ollama_messages
+        
+        return []
+    
+    def _formatted_history(self, messages: List[Message]) -> _FormattedHistory:
+        """Get the encoded history, formatting only messages appended since the last call.
+        
+        Fragments of messages evicted from the front of a MessageStore are
+        dropped, everything else is reused as is.
+        """
+        if not isinstance(messages, MessageStore):
+            # No way to tell what changed in a plain list, format it all
+            history = _FormattedHistory()
+            self._append_formatted(history, messages, self._tool_name_index(messages).get)
+            return history
+        
+        history = self._history_cache.get(messages)
+        if history is None or history.formatted < messages.evicted:
+            history = _FormattedHistory(formatted=messages.evicted)
+            self._history_cache[messages] = history
+        
+        # Drop fragments of messages evicted since the last call
+        dropped = messages.evicted - (history.formatted - len(history.counts))
+        if dropped > 0:
+            fragment_count = sum(history.counts[:dropped])
+            del history.counts[:dropped]
+            del history.fragments[:fragment_count]
+            del history.chars[:fragment_count]
+        
+        new_messages = messages[history.formatted - messages.evicted:]
+        if new_messages:
+            self._append_formatted(history, new_messages, messages.tool_name)
+        return history
+    
+    def _append_formatted(self, history: _FormattedHistory, messages: List[Message], find_tool_name):
+        """Format and encode messages onto the end of a formatted history."""
+        for msg in messages:
+            ollama_messages = self._format_message(msg, find_tool_name)
+            for ollama_message in ollama_messages:
+                history.fragments.append(json.dumps(ollama_message).encode())
+                history.chars.append(len(ollama_message["content"]))
+            history.counts.append(len(ollama_messages))
+            history.formatted += 1
+    
+    def _format_tools(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Format tools according to Ollama's expected structure."""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": tool["name"],  # Use full namespaced name 
+                    "description": tool.get("description", ""),
+                    "parameters": tool["inputSchema"]
+                }
+            }
+            for tool in tools
+        ]
+    
+    def _encode_tool(self, tool: Dict[str, Any]) -> Tuple[bytes, int]:
+        """Encode one tool definition, with the character count used for token estimates."""
+        formatted = self._format_tools([tool])[0]
+        function = formatted["function"]
+        parameters_json = json.dumps(function["parameters"])
+        chars = len(function["name"]) + len(function["description"]) + len(parameters_json)
+        return json.dumps(formatted).encode(), chars
+    
+    def _encoded_tools(self, tools: List[Dict[str, Any]], tools_version: Optional[int] = None) -> Tuple[bytes, int]:
+        """Get the encoded tools array and its estimated size in characters.
+        
+        With a catalog version, each tool is encoded once per version and the
+        last assembled array is reused as is, so subsets of the catalog also
+        only pay for the join. Without one, the tools are encoded every call.
+        """
+        if tools_version is None:
+            encoded = [self._encode_tool(tool) for tool in tools]
+            return b"[" + b",".join(fragment for fragment, _ in encoded) + b"]", sum(chars for _, chars in encoded)
+        
+        if tools_version != self._tools_version:
+            self._tools_version = tools_version
+            self._tool_fragments = {}
+            self._tools_array = None
+        
+        key = tuple(tool["name"] for tool in tools)
+        if self._tools_array is not None and self._tools_array[0] == key:
+            return self._tools_array[1], self._tools_array[2]
+        
+        encoded = []
+        for tool in tools:
+            fragment = self._tool_fragments.get(tool["name"])
+            if fragment is None:
+                fragment = self._tool_fragments[tool["name"]] = self._encode_tool(tool)
+            encoded.append(fragment)
+        
+        tools_json = b"[" + b",".join(fragment for fragment, _ in encoded) + b"]"
+        tools_chars = sum(chars for _, chars in encoded)
+        self._tools_array = (key, tools_json, tools_chars)
+        return tools_json, tools_chars
+    
+    def _build_payload(
         self, 
         messages: List[Message], 
         tools: List[Dict[str, Any]] = None, 
-        prompt: str = None
-    ) -> Message:
-        """Create a message using Ollama LLM."""
-        # Format messages for Ollama
-        ollama_messages = []
+        prompt: str = None,
+        stream: bool = False,
+        tools_version: Optional[int] = None
+    ) -> _Payload:
+        """Build the encoded /api/chat request body.
         
-        # Track if we have any tool results to prepare context
-        has_tool_results = False
+        The body is assembled from pre-encoded message fragments, so the
+        cost per call depends on what was appended, not the history length.
+        """
+        history = self._formatted_history(messages)
+        fragments = list(history.fragments)
+        message_chars = sum(history.chars)
         
-        # Process all messages for Ollama
-        for msg in messages:
-            # Skip empty messages
-            if not msg.content:
-                continue
-                
-            if msg.role == "user" or msg.role == "assistant":
-                # Get text content from the message
-                text_content = msg.get_text_content()
-                
-                if text_content:
-                    ollama_messages.append({
-                        "role": msg.role,
-                        "content": text_content
-                    })
-                    
-            elif msg.role == "tool":
-                has_tool_results = True
-                # For tool responses, add as a tool role in Ollama
-                for block in msg.content:
-                    if block.type == "tool_result" and block.content:
-                        # Get tool content as text
-                        tool_content = ""
-                        if isinstance(block.content, list):
-                            for content_item in block.content:
-                                if isinstance(content_item, dict) and content_item.get("type") == "text":
-                                    tool_content += content_item.get("text", "")
-                        elif isinstance(block.content, str):
-                            tool_content = block.content
-                            
-                        # Find the corresponding tool_call to get the name
-                        tool_name = self._find_tool_name_for_response(messages, block.tool_use_id)
-                        
-                        # Add as tool message
-                        ollama_messages.append({
-                            "role": "tool", 
-                            "content": tool_content,
-                            "name": tool_name or "unknown_tool"
-                        })
-                        
         # Add the new prompt if provided
         if prompt:
-            ollama_messages.append({
-                "role": "user",
-                "content": prompt
-            })
+            fragments.append(json.dumps({"role": "user", "content": prompt}).encode())
+            message_chars += len(prompt)
             
         # Avoid empty message list
-        if not ollama_messages:
-            ollama_messages.append({
-                "role": "system",
-                "content": "You are a helpful assistant."
-            })
-        
-        # Prepare request payload for chat
-        payload = {
-            "model": self.model,
-            "messages": ollama_messages,
-            "stream": False
-        }
+        if not fragments:
+            fragments.append(json.dumps({"role": "system", "content": "You are a helpful assistant."}).encode())
+        
+        parts = [
+            b'{"model":', json.dumps(self.model).encode(),
+            b',"stream":', b"true" if stream else b"false",
+            b',"messages":[', b",".join(fragments), b"]"
+        ]
         
         # Add additional parameters from config
-        if self.parameters:
-            payload["options"] = self.parameters
+        parts += [b',"options":', json.dumps(self._options()).encode()]
         
         # Add tools if provided and supported
-        formatted_tools = []
+        tools_chars = 0
         if tools and self._supports_function_calling():
-            for tool in tools:
-                # Extract the actual tool name (removing server prefix if present)
-                tool_name = tool["name"]
-                original_name = tool_name
-                
-                if "__" in tool_name:
-                    _, original_name = tool_name.split("__", 1)
-                
-                # Format tool according to Ollama's expected structure
-                formatted_tools.append({
-                    "type": "function",
-                    "function": {
-                        "name": tool_name,  # Use full namespaced name 
-                        "description": tool.get("description", ""),
-                        "parameters": tool["inputSchema"]
-                    }
-                })
-            
-            # Add tools to the payload
-            if formatted_tools:
-                payload["tools"] = formatted_tools
-                logger.debug(f"Sending {len(formatted_tools)} tools to Ollama")
+            tools_json, tools_chars = self._encoded_tools(tools, tools_version)
+            parts += [b',"tools":', tools_json]
+            logger.debug(f"Sending {len(tools)} tools to Ollama")
+        
+        parts.append(b"}")
         
         # Log what we're sending to Ollama
-        logger.debug(f"Sending {len(ollama_messages)} messages to Ollama, has_tool_results={has_tool_results}")
+        logger.debug(f"Sending {len(fragments)} messages to Ollama")
+        return _Payload(
+            body=b"".join(parts),
+            message_count=len(fragments),
+            message_chars=message_chars,
+            tools_chars=tools_chars
+        )
+    
+    async def create_message(
+        self, 
+        messages: List[Message], 
+        tools: List[Dict[str, Any]] = None, 
+        prompt: str = None,
+        tools_version: Optional[int] = None
+    ) -> Message:
+        """Create a message using Ollama LLM.
+        
+        Pass the catalog version the tools came from as tools_version to
+        reuse their encoded definitions across calls.
+        """
+        payload = self._build_payload(messages, tools, prompt, tools_version=tools_version)
         
         # Make API call with retries
         retries = 0
         backoff = INITIAL_BACKOFF
         
-        async with aiohttp.ClientSession() as session:
-            while True:
-                try:
-                    # Ollama API endpoint for chat completion
-                    url = f"{self.url}/api/chat"
+        session = self._get_session()
+        while True:
+            try:
+                # Ollama API endpoint for chat completion
+                url = f"{self.url}/api/chat"
+                
+                logger.debug(f"Sending request to {url}")
+                
+                async with session.post(url, data=payload.body, headers=JSON_HEADERS, timeout=60) as response:
+                    if response.status >= 400:
+                        error_text = await response.text()
+                        raise RuntimeError(f"Ollama API error ({response.status}): {error_text}")
+                        
+                    result = await response.json()
+                    self._calibrate(payload, result.get("prompt_eval_count"))
                     
-                    logger.debug(f"Sending request to {url}")
+                    content_blocks = self._parse_response_message(result.get("message", {}))
+                    return Message(role="assistant", content=content_blocks)
+            
+            except Exception as e:
+                error_msg = str(e)
+                logger.error(f"Error from Ollama API: {error_msg}")
+                
+                # Retry on certain error conditions
+                if (retries < MAX_RETRIES and 
+                    ("overloaded" in error_msg.lower() or 
+                     "timeout" in error_msg.lower() or
+                     "connection" in error_msg.lower())):
+                    retries += 1
+                    logger.warning(f"Ollama request failed, backing off (attempt {retries}/{MAX_RETRIES}, {backoff}s)")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    continue
+                else:
+                    # Create an error message
+                    return Message(
+                        role="assistant",
+                        content=[ContentBlock(
+                            type="text",
+                            text=f"Error communicating with Ollama: {error_msg}"
+                        )]
+                    )
+    
+    async def stream_message(
+        self, 
+        messages: List[Message], 
+        tools: List[Dict[str, Any]] = None, 
+        prompt: str = None,
+        tools_version: Optional[int] = None
+    ) -> AsyncIterator[StreamEvent]:
+        """Stream a message from Ollama as it is generated.
+        
+        Parses the NDJSON /api/chat stream incrementally, yielding "text" and
+        "tool_call" events as they arrive and finally one "message" event
+        carrying the assembled Message.
+        """
+        payload = self._build_payload(messages, tools, prompt, stream=True, tools_version=tools_version)
+        
+        # Make API call with retries, only possible until something was yielded
+        retries = 0
+        backoff = INITIAL_BACKOFF
+        
+        session = self._get_session()
+        while True:
+            text_parts = []
+            tool_blocks = []
+            ttft = None
+            start_time = time.perf_counter()
+            try:
+                url = f"{self.url}/api/chat"
+                logger.debug(f"Sending streaming request to {url}")
+                
+                # No total timeout, generation may take a while, but a stalled stream is an error
+                timeout = aiohttp.ClientTimeout(total=None, sock_read=60)
+                async with session.post(url, data=payload.body, headers=JSON_HEADERS, timeout=timeout) as response:
+                    if response.status >= 400:
+                        error_text = await response.text()
+                        raise RuntimeError(f"Ollama API error ({response.status}): {error_text}")
                     
-                    async with session.post(url, json=payload, timeout=60) as response:
-                        if response.status >= 400:
-                            error_text = await response.text()
-                            raise RuntimeError(f"Ollama API error ({response.status}): {error_text}")
-                            
-                        result = await response.json()
-                        
-                        # Process the response
-                        content_blocks = []
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line:
+                            continue
                         
-                        # Add text response if present
-                        if "message" in result and "content" in result["message"] and result["message"]["content"]:
-                            content_blocks.append(ContentBlock(
-                                type="text",
-                                text=result["message"]["content"]
-                            ))
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            raise RuntimeError(f"Ollama API error: {chunk['error']}")
                         
-                        # Handle tool calls if present
-                        if "message" in result and "tool_calls" in result["message"]:
-                            tool_calls = result["message"].get("tool_calls", [])
-                            logger.debug(f"Received {len(tool_calls)} tool calls from Ollama")
+                        for block in self._parse_response_message(chunk.get("message", {})):
+                            if ttft is None:
+                                ttft = time.perf_counter() - start_time
+                                logger.debug(f"Ollama first token after {ttft:.2f}s")
                             
-                            for tool_call in tool_calls:
-                                if "function" in tool_call:
-                                    function_call = tool_call["function"]
-                                    tool_name = function_call["name"]
-                                    
-                                    logger.debug(f"Ollama returned tool call for: {tool_name}")
-                                    
-                                    # Create tool_use block
-                                    content_blocks.append(ContentBlock(
-                                        type="tool_use",
-                                        id=str(uuid.uuid4()),  # Generate a unique ID
-                                        name=tool_name,
-                                        input=function_call.get("arguments", {})
-                                    ))
+                            if block.type == "text":
+                                text_parts.append(block.text)
+                                yield StreamEvent(type="text", text=block.text)
+                            else:
+                                tool_blocks.append(block)
+                                yield StreamEvent(type="tool_call", id=block.id, name=block.name, input=block.input)
                         
-                        return Message(role="assistant", content=content_blocks)
+                        if chunk.get("done"):
+                            self._calibrate(payload, chunk.get("prompt_eval_count"))
+                            break
+                
+                content_blocks = []
+                if text_parts:
+                    content_blocks.append(ContentBlock(type="text", text="".join(text_parts)))
+                content_blocks.extend(tool_blocks)
+                yield StreamEvent(
+                    type="message",
+                    message=Message(role="assistant", content=content_blocks),
+                    ttft=ttft
+                )
+                return
+            
+            except Exception as e:
+                error_msg = str(e)
+                logger.error(f"Error from Ollama API: {error_msg}")
                 
-                except Exception as e:
-                    error_msg = str(e)
-                    logger.error(f"Error from Ollama API: {error_msg}")
+                # Retry on certain error conditions, unless output was already streamed
+                if (retries < MAX_RETRIES and not text_parts and not tool_blocks and
+                    ("overloaded" in error_msg.lower() or 
+                     "timeout" in error_msg.lower() or
+                     "connection" in error_msg.lower())):
+                    retries += 1
+                    logger.warning(f"Ollama request failed, backing off (attempt {retries}/{MAX_RETRIES}, {backoff}s)")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_BACKOFF)
+                    continue
+                
+                # Finish with an error message
+                error_text = f"Error communicating with Ollama: {error_msg}"
+                yield StreamEvent(type="text", text=error_text)
+                yield StreamEvent(
+                    type="message",
+                    message=Message(
+                        role="assistant",
+                        content=[ContentBlock(type="text", text="".join(text_parts) + error_text)]
+                    ),
+                    ttft=ttft
+                )
+                return
+    
+    def _parse_response_message(self, message: Dict[str, Any]) -> List[ContentBlock]:
+        """Convert an Ollama response message into content blocks."""
+        content_blocks = []
+        
+        # Add text response if present
+        if message.get("content"):
+            content_blocks.append(ContentBlock(
+                type="text",
+                text=message["content"]
+            ))
+        
+        # Handle tool calls if present
+        if "tool_calls" in message:
+            tool_calls = message.get("tool_calls") or []
+            logger.debug(f"Received {len(tool_calls)} tool calls from Ollama")
+            
+            for tool_call in tool_calls:
+                if "function" in tool_call:
+                    function_call = tool_call["function"]
+                    tool_name = function_call["name"]
+                    
+                    logger.debug(f"Ollama returned tool call for: {tool_name}")
                     
-                    # Retry on certain error conditions
-                    if (retries < MAX_RETRIES and 
-                        ("overloaded" in error_msg.lower() or 
-                         "timeout" in error_msg.lower() or
-                         "connection" in error_msg.lower())):
-                        retries += 1
-                        logger.warning(f"Ollama request failed, backing off (attempt {retries}/{MAX_RETRIES}, {backoff}s)")
-                        await asyncio.sleep(backoff)
-                        backoff = min(backoff * 2, MAX_BACKOFF)
-                        continue
-                    else:
-                        # Create an error message
-                        return Message(
-                            role="assistant",
-                            content=[ContentBlock(
-                                type="text",
-                                text=f"Error communicating with Ollama: {error_msg}"
-                            )]
-                        )
+                    # Create tool_use block
+                    content_blocks.append(ContentBlock(
+                        type="tool_use",
+                        id=str(uuid.uuid4()),  # Generate a unique ID
+                        name=tool_name,
+                        input=function_call.get("arguments", {})
+                    ))
+        
+        return content_blocks
     
     def _supports_function_calling(self) -> bool:
         """Determine if the current model supports function calling."""
@@ -294,11 +626,10 @@ class OllamaProvider:
         
         return False
         
-    def _find_tool_name_for_response(self, messages: List[Message], tool_use_id: str) -> Optional[str]:
-        """Find the tool name that corresponds to a tool response ID."""
-        for msg in messages:
-            if msg.role == "assistant":
-                for block in msg.content:
-                    if block.type == "tool_use" and block.id == tool_use_id:
-                        return block.name
-        return None
\ No newline at end of file
+    def _tool_name_index(self, messages: List[Message]) -> Dict[str, str]:
+        """Map tool_use ids to tool names in a single pass over the history."""
+        return {
+            block.id: block.name
+            for msg in messages if msg.role == "assistant"
+            for block in msg.content if block.type == "tool_use"
+        }
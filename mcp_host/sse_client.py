@@ -2,15 +2,25 @@ import os
 import json
 import re
 import asyncio
-import time
 import uuid
+import random
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Awaitable, Callable, Optional
 import aiohttp
 from aiohttp.client_exceptions import ClientError
 
+from .http_pool import http_pool
+from .sse_parser import SSEParser
+
 logger = logging.getLogger("mcp-host")
 
+# Reconnection after the event stream is lost
+RECONNECT_INITIAL_DELAY = 0.5  # seconds, unless the server sent retry:
+RECONNECT_MAX_DELAY = 30.0     # seconds
+RECONNECT_WAIT = 5.0           # seconds a new request waits for a reconnect before failing
+ENDPOINT_TIMEOUT = 10.0        # seconds to wait for the endpoint event on a new stream
+HANDSHAKE_METHODS = ("initialize", "notifications/initialized")  # Sent before the session is ready
+
 class SSEClient:
     """Client for communicating with an MCP server via Server-Sent Events (SSE)."""
     
@@ -20,103 +30,178 @@ class SSEClient:
         self.base_url = url.rstrip('/').rsplit('/sse', 1)[0]
         self.session = None
         self.response = None
-        self.event_queue = asyncio.Queue()
+        self._pending: Dict[Any, asyncio.Future] = {}  # Outstanding requests keyed by JSON-RPC id
+        self.notification_handler: Optional[Callable[[Dict[str, Any]], None]] = None
         self.endpoint_ready = asyncio.Event()
         self.initialized = False
         self._sse_task = None
         self.session_id = f"mcp-host-{uuid.uuid4()}"
         self.server_endpoint = None
+        self.parser = SSEParser()  # Tracks the last event ID and retry delay across the stream
+        self.ready = asyncio.Event()  # Set while the stream is up and the MCP session usable
+        self.reconnects = 0
+        self._closing = False
+        self._resume_task = None
+        # Called after a reconnect lands on a new server session, re-runs the MCP handshake
+        self.session_lost_handler: Optional[Callable[[], Awaitable[bool]]] = None
         logger.debug(f"Created SSEClient {name} with initial session_id: {self.session_id}")
     
     async def connect(self):
         """Establish SSE connection to the server."""
         try:
-            # Create a new session
-            self.session = aiohttp.ClientSession()
-            
-            # Reset the endpoint event flag
-            self.endpoint_ready.clear()
-            
-            # Connect to the SSE endpoint with our initial session ID
-            sse_url_with_session = f"{self.sse_url}?session_id={self.session_id}"
-            logger.debug(f"Connecting to SSE endpoint: {sse_url_with_session}")
-            
-            self.response = await self.session.get(sse_url_with_session)
-            
-            if self.response.status != 200:
-                error_text = await self.response.text()
-                raise RuntimeError(f"Server returned error: {self.response.status} - {error_text}")
+            # Use the host-wide pooled session, so servers on one host share connections
+            if self.session is None:
+                self.session = http_pool.acquire()
             
+            self._closing = False
+            self.parser = SSEParser()
+            await self._open_stream()
             logger.info(f"Connected to SSE endpoint for server: {self.name}")
             
-            # Start the event processing task
-            self._sse_task = asyncio.create_task(self._process_sse_events())
+            # Start the task that reads the stream and reconnects when it is lost
+            self._sse_task = asyncio.create_task(self._run_stream())
             
             # Wait for the server to send us the endpoint event
             logger.debug(f"Waiting for endpoint event from server...")
             try:
-                await asyncio.wait_for(self.endpoint_ready.wait(), timeout=10.0)
+                await asyncio.wait_for(self.endpoint_ready.wait(), timeout=ENDPOINT_TIMEOUT)
                 logger.info(f"Received server endpoint: {self.server_endpoint}")
+                self.ready.set()
                 return True
             except asyncio.TimeoutError:
                 logger.error(f"Timed out waiting for endpoint event from {self.name}")
+                # Stop the stream task so it doesn't keep reconnecting, and release the pool
+                await self.disconnect()
                 return False
         except Exception as e:
             logger.error(f"Failed to connect to SSE endpoint for {self.name}: {str(e)}")
             await self.disconnect()
             return False
     
+    async def _open_stream(self):
+        """Open the event stream, resuming from the last event ID if there is one."""
+        self.endpoint_ready.clear()
+        if self.response:
+            self.response.close()
+            self.response = None
+        
+        # Carry the resumption state over, the framing starts from scratch
+        previous = self.parser
+        self.parser = SSEParser()
+        self.parser.last_event_id = previous.last_event_id
+        self.parser.retry = previous.retry
+        
+        headers = {"Accept": "text/event-stream"}
+        if self.parser.last_event_id is not None:
+            headers["Last-Event-ID"] = self.parser.last_event_id
+        
+        # Connect to the SSE endpoint with our session ID
+        sse_url_with_session = f"{self.sse_url}?session_id={self.session_id}"
+        logger.debug(f"Connecting to SSE endpoint: {sse_url_with_session}")
+        
+        # The stream stays open for the life of the client, only bound the connect
+        response = await self.session.get(
+            sse_url_with_session,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10)
+        )
+        if response.status != 200:
+            error_text = await response.text()
+            response.release()
+            raise RuntimeError(f"Server returned error: {response.status} - {error_text}")
+        self.response = response
+    
+    async def _run_stream(self):
+        """Read the event stream, reconnecting with backoff whenever it is lost."""
+        while True:
+            await self._process_sse_events()
+            if self._closing:
+                return
+            
+            # Nothing sent on the lost session will be answered, fail it all now
+            logger.warning(f"SSE stream from {self.name} was lost, reconnecting")
+            self.ready.clear()
+            if self._resume_task and not self._resume_task.done():
+                self._resume_task.cancel()
+            self._fail_pending(ConnectionError(f"SSE stream from {self.name} was lost"))
+            
+            previous_endpoint = self.server_endpoint
+            await self._reopen_stream()
+            self._resume_task = asyncio.create_task(self._resume_session(previous_endpoint))
+    
+    async def _reopen_stream(self):
+        """Retry opening the event stream until it succeeds."""
+        attempt = 0
+        while True:
+            delay = self._reconnect_delay(attempt)
+            logger.debug(f"Reconnecting to {self.name} in {delay:.2f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+            try:
+                await self._open_stream()
+                self.reconnects += 1
+                return
+            except Exception as e:
+                logger.warning(f"Reconnect to {self.name} failed: {str(e)}")
+                attempt += 1
+    
+    def _reconnect_delay(self, attempt: int) -> float:
+        """Exponential backoff from the server's retry: delay, with jitter to spread reconnects out."""
+        base = self.parser.retry / 1000 if self.parser.retry is not None else RECONNECT_INITIAL_DELAY
+        delay = min(RECONNECT_MAX_DELAY, base * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+    
+    async def _resume_session(self, previous_endpoint: Optional[str]):
+        """Wait for the new stream's endpoint and redo the MCP handshake if the session changed."""
+        try:
+            await asyncio.wait_for(self.endpoint_ready.wait(), timeout=ENDPOINT_TIMEOUT)
+            
+            if self.server_endpoint != previous_endpoint and self.session_lost_handler:
+                logger.info(f"Server session for {self.name} was lost, re-initializing")
+                if not await self.session_lost_handler():
+                    raise RuntimeError("handshake failed")
+            
+            self.ready.set()
+            logger.info(f"Reconnected to SSE server: {self.name}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Drop the stream, the reader task will try again
+            logger.error(f"Failed to resume session with {self.name}: {str(e) or type(e).__name__}")
+            if self.response:
+                self.response.close()
+    
     async def _process_sse_events(self):
         """Process SSE events from the event stream."""
-        event_type = None
-        event_data = None
-        
-        async for line_bytes in self.response.content:
+        try:
+            async for chunk in self.response.content.iter_any():
+                self._handle_events(self.parser.feed(chunk))
+            # An event cut off by the end of the stream is incomplete, drop it
+            self.parser.flush()
+        except asyncio.CancelledError:
+            logger.debug(f"SSE event processing task cancelled for {self.name}")
+            raise
+        except Exception as e:
+            logger.warning(f"Error reading SSE stream from {self.name}: {str(e)}")
+    
+    def _handle_events(self, events):
+        """Handle the events completed by one parser call."""
+        for event in events:
             try:
-                line = line_bytes.decode('utf-8').rstrip()
-                logger.debug(f"SSE line: {line}")
-                
-                # Empty line marks end of event
-                if not line:
-                    if event_type and event_data:
-                        await self._handle_event(event_type, event_data)
-                    
-                    # Reset for next event
-                    event_type = None
-                    event_data = None
-                    continue
-                
-                # Parse event type
-                if line.startswith("event:"):
-                    event_type = line[6:].strip()
-                    continue
-                
-                # Parse event data
-                if line.startswith("data:"):
-                    event_data = line[5:].strip()
-                    continue
-                
-                # Handle ping/comment lines that start with :
-                if line.startswith(":"):
-                    # Just a keep-alive or comment, ignore
-                    continue
-                
-            except asyncio.CancelledError:
-                logger.debug(f"SSE event processing task cancelled for {self.name}")
-                raise
+                self._handle_event(event.event, event.data)
             except Exception as e:
-                logger.error(f"Error processing SSE line: {str(e)}")
+                logger.error(f"Error handling SSE event from {self.name}: {str(e)}")
     
-    async def _handle_event(self, event_type: str, event_data: str):
+    def _handle_event(self, event_type: str, event_data: bytes):
         """Handle a complete SSE event."""
-        logger.debug(f"Handling event: type={event_type}, data={event_data}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Handling event from {self.name}: type={event_type}, {len(event_data)} bytes")
         
         if event_type == "endpoint":
             # This is the critical endpoint event that gives us the URL to use
-            self.server_endpoint = event_data
+            self.server_endpoint = event_data.decode("utf-8").strip()
             
             # Extract session_id from the endpoint URL if present
-            match = re.search(r'session_id=([^&\s]+)', event_data)
+            match = re.search(r'session_id=([^&\s]+)', self.server_endpoint)
             if match:
                 self.session_id = match.group(1)
                 logger.debug(f"Extracted session_id from endpoint: {self.session_id}")
@@ -125,14 +210,37 @@ class SSEClient:
             self.endpoint_ready.set()
             
         elif event_type == "message":
-            # Regular message, try to parse as JSON
+            # Regular message, the JSON decoder takes the raw bytes
             try:
                 message_obj = json.loads(event_data)
-                await self.event_queue.put(message_obj)
-            except json.JSONDecodeError:
-                logger.error(f"Received invalid JSON in message event: {event_data}")
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                logger.error(f"Received invalid JSON in message event from {self.name}")
+                return
+            self._route_message(message_obj)
+    
+    def _route_message(self, message_obj: Dict[str, Any]):
+        """Resolve the waiter for a response, or dispatch a notification."""
+        if "method" in message_obj:
+            logger.debug(f"Received notification: {message_obj['method']}")
+            if "id" not in message_obj and self.notification_handler:
+                self.notification_handler(message_obj)
+            return
+        
+        future = self._pending.get(message_obj.get("id"))
+        if future is not None and not future.done():
+            logger.debug(f"Found matching response for request {message_obj.get('id')}")
+            future.set_result(message_obj)
+        else:
+            logger.warning(f"Received response for unknown request ID {message_obj.get('id')} from {self.name}")
+    
+    def _fail_pending(self, exc: Exception):
+        """Fail every outstanding request with the given exception."""
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
     
-    async def send_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def send_message(self, message: Dict[str, Any], timeout: float = 30.0) -> Dict[str, Any]:
         """Send a message to the server using the endpoint URL."""
         if not self.session:
             raise RuntimeError(f"No session for {self.name}")
@@ -140,6 +248,23 @@ class SSEClient:
         if not self.server_endpoint:
             raise RuntimeError(f"No endpoint URL received from server {self.name}")
         
+        # While reconnecting, only the handshake may go out; other requests wait briefly
+        if not self.ready.is_set() and message.get("method") not in HANDSHAKE_METHODS:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout=min(timeout, RECONNECT_WAIT))
+            except asyncio.TimeoutError:
+                raise ConnectionError(f"SSE connection to {self.name} is reconnecting")
+        
+        # Register the waiter before posting, the reply may arrive on the
+        # stream before the POST itself completes
+        request_id = message.get("id")
+        future = None
+        if "id" in message:
+            if request_id in self._pending:
+                raise RuntimeError(f"Duplicate request id {request_id} for {self.name}")
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
+        
         try:
             # Construct the full URL for the message endpoint
             if self.server_endpoint.startswith('/'):
@@ -151,67 +276,36 @@ class SSEClient:
             
             logger.debug(f"Sending message to {message_url}: {json.dumps(message)}")
             
-            async with self.session.post(message_url, json=message) as response:
+            async with self.session.post(message_url, json=message, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
                 if response.status not in [200, 202]:
                     error_text = await response.text()
                     raise RuntimeError(f"Server returned error: {response.status} - {error_text}")
-                
-                # For JSON-RPC requests, we need to wait for the response in the SSE stream
-                if "id" in message:
-                    return await self._wait_for_response(message["id"])
-                
+            
+            # For JSON-RPC requests, the response arrives on the SSE stream
+            if future is None:
                 return {}
+            
+            try:
+                return await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout waiting for response from {self.name}")
+                raise TimeoutError(f"Timeout waiting for response to request {request_id}")
         except Exception as e:
             logger.error(f"Error sending message to {self.name}: {str(e)}")
             raise
-    
-    async def _wait_for_response(self, request_id: Any, timeout: float = 30.0) -> Dict[str, Any]:
-        """Wait for a response with a matching ID from the SSE event stream."""
-        try:
-            start_time = time.time()
-            logger.debug(f"Waiting for response to request {request_id}")
-            
-            while time.time() - start_time < timeout:
-                try:
-                    # Wait for a message with a short timeout
-                    try:
-                        event = await asyncio.wait_for(self.event_queue.get(), timeout=0.5)
-                    except asyncio.TimeoutError:
-                        # No message yet, keep waiting
-                        continue
-                    
-                    # Check if this is a notification
-                    if "id" not in event and "method" in event:
-                        logger.debug(f"Received notification: {event['method']}")
-                        # Process notification if needed
-                        continue
-                    
-                    # Check if this matches our request
-                    if "id" in event and event["id"] == request_id:
-                        logger.debug(f"Found matching response for request {request_id}")
-                        return event
-                    
-                    # If we get here, we received a response for a different request
-                    # Put it back in the queue for other waiters
-                    await self.event_queue.put(event)
-                    
-                    # Wait a bit before checking again
-                    await asyncio.sleep(0.1)
-                except asyncio.QueueEmpty:
-                    # Wait a bit before checking again
-                    await asyncio.sleep(0.1)
-            
-            raise TimeoutError(f"Timeout waiting for response to request {request_id}")
-        except Exception as e:
-            if isinstance(e, TimeoutError):
-                logger.error(f"Timeout waiting for response from {self.name}")
-            else:
-                logger.error(f"Error waiting for response from {self.name}: {str(e)}")
-            raise
+        finally:
+            if future is not None:
+                self._pending.pop(request_id, None)
             
     async def disconnect(self):
         """Close the SSE connection according to the MCP HTTP shutdown protocol."""
         logger.debug(f"Disconnecting SSE client for {self.name}")
+        self._closing = True
+        self.ready.clear()
+        
+        if self._resume_task and not self._resume_task.done():
+            self._resume_task.cancel()
+        self._resume_task = None
         
         if self._sse_task and not self._sse_task.done():
             logger.debug(f"Cancelling SSE event processing task for {self.name}")
@@ -226,6 +320,8 @@ class SSEClient:
             
             self._sse_task = None
         
+        self._fail_pending(RuntimeError(f"SSE connection to {self.name} was closed"))
+        
         if self.response:
             logger.debug(f"Closing SSE response for {self.name}")
             try:
@@ -236,15 +332,8 @@ class SSEClient:
             self.response = None
         
         if self.session:
-            logger.debug(f"Closing HTTP session for {self.name}")
-            try:
-                # Use timeout with session close
-                await asyncio.wait_for(self.session.close(), timeout=2.0)
-            except asyncio.TimeoutError:
-                logger.warning(f"Timeout closing HTTP session for {self.name}")
-            except Exception as e:
-                logger.debug(f"Error closing HTTP session (non-critical): {str(e)}")
-                
+            logger.debug(f"Releasing HTTP session for {self.name}")
             self.session = None
+            await http_pool.release()
         
         logger.info(f"Disconnected from SSE server: {self.name}")
\ No newline at end of file
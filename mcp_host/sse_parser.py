@@ -0,0 +1,141 @@
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+logger = logging.getLogger("mcp-host")
+
+UTF8_BOM = b"\xef\xbb\xbf"
+
+@dataclass(slots=True)
+class SSEEvent:
+    """One dispatched Server-Sent Event."""
+    event: str  # Event type, "message" unless the stream named one
+    data: bytes  # Data lines joined with newlines, ready for json.loads
+    id: Optional[str] = None  # Last event ID seen on the stream when this event was dispatched
+
+class SSEParser:
+    """Incremental parser for a text/event-stream, fed raw byte chunks.
+    
+    Follows the WHATWG event stream rules: lines may end in CRLF, LF or CR,
+    multi-line data is joined with newlines, and id and retry fields are
+    tracked for reconnection. Data stays as bytes, it is only decoded by
+    whoever consumes the event. Call flush() when the stream ends.
+    """
+    
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scan_from = 0  # Buffer offset up to which no line ending was found
+        self._started = False
+        self._skip_lf = False  # The last chunk ended in CR, a LF starting the next one belongs to it
+        self._data: List[bytes] = []
+        self._event_type: Optional[str] = None
+        self.last_event_id: Optional[str] = None  # Sent back as Last-Event-ID when reconnecting
+        self.retry: Optional[int] = None  # Reconnection delay requested by the server, in milliseconds
+        
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Parse a chunk of the stream and return the events it completed."""
+        buffer = self._buffer
+        buffer += chunk
+        if not self._started:
+            if len(buffer) < len(UTF8_BOM) and UTF8_BOM.startswith(bytes(buffer)):
+                return []  # Not enough bytes yet to rule out a BOM
+            if buffer.startswith(UTF8_BOM):
+                del buffer[:len(UTF8_BOM)]
+            self._started = True
+        if self._skip_lf and buffer:
+            if buffer[0] == 0x0A:
+                del buffer[:1]
+            self._skip_lf = False
+            
+        events = []
+        start = 0
+        search = self._scan_from
+        length = len(buffer)
+        find = buffer.find
+        data = self._data
+        with memoryview(buffer) as view:  # Slicing a view copies each line once, not twice
+            while True:
+                newline = find(b"\n", search)
+                carriage = find(b"\r", search, newline if newline != -1 else length)
+                if carriage != -1:
+                    end = carriage
+                    if carriage + 1 == length:
+                        # The line ends here even if a LF follows in the next chunk, it is dropped then
+                        next_start = length
+                        self._skip_lf = True
+                    else:
+                        next_start = carriage + 2 if buffer[carriage + 1] == 0x0A else carriage + 1
+                elif newline != -1:
+                    end = newline
+                    next_start = newline + 1
+                else:
+                    search = length
+                    break
+                    
+                if buffer.startswith(b"data:", start, end):
+                    # Fast path for the common case, copy the value straight out of the buffer
+                    value_start = start + 5
+                    if value_start < end and buffer[value_start] == 0x20:
+                        value_start += 1
+                    data.append(bytes(view[value_start:end]))
+                elif start == end:
+                    self._dispatch(events)
+                    data = self._data
+                else:
+                    self._process_line(bytes(view[start:end]))
+                start = search = next_start
+                
+        if start:
+            del buffer[:start]
+        self._scan_from = search - start
+        return events
+        
+    def flush(self, complete_partial: bool = False) -> List[SSEEvent]:
+        """End of stream: drop an event that was not terminated by a blank line.
+        
+        The id and retry fields seen so far are kept. With complete_partial
+        the unterminated event is dispatched instead, which WHATWG does not
+        allow; only use it where the stream's end is known to be intact.
+        """
+        events = []
+        line = bytes(self._buffer)
+        self._buffer.clear()
+        self._scan_from = 0
+        if complete_partial:
+            if line:
+                self._process_line(line)
+            self._dispatch(events)
+        else:
+            self._data = []
+            self._event_type = None
+        return events
+        
+    def _process_line(self, line: bytes):
+        """Apply a line other than a data line or a blank line to the event being built."""
+        colon = line.find(b":")
+        if colon == 0:
+            return  # Comment, used as keep-alive
+        if colon == -1:
+            field, value = line, b""
+        else:
+            value_start = colon + 2 if line.startswith(b" ", colon + 1) else colon + 1
+            field, value = line[:colon], line[value_start:]
+            
+        if field == b"data":
+            self._data.append(value)
+        elif field == b"event":
+            self._event_type = value.decode("utf-8", "replace")
+        elif field == b"id":
+            if b"\0" not in value:
+                self.last_event_id = value.decode("utf-8", "replace")
+        elif field == b"retry":
+            if value.isdigit():
+                self.retry = int(value)
+                
+    def _dispatch(self, events: List[SSEEvent]):
+        """Complete the current event on a blank line."""
+        if self._data:
+            data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+            events.append(SSEEvent(self._event_type or "message", data, self.last_event_id))
+        self._data = []
+        self._event_type = None
@@ -0,0 +1,72 @@
+import shlex
+import asyncio
+import logging
+from typing import Dict, List
+
+from .ssh_pool import SSHTarget, ssh_pool
+from .stdio_client import StdioClient
+
+logger = logging.getLogger("mcp-host")
+
+class SSHClient(StdioClient):
+    """Client for an MCP stdio server run on a remote host over SSH.
+    
+    The server's stdin, stdout and stderr are the streams of an SSH
+    channel, so messaging is the same as for a local stdio server. Servers
+    on the same host share one SSH connection from the pool.
+    """
+    
+    def __init__(self, name: str, target: SSHTarget, command: str, args: List[str], env: Dict[str, str] = None):
+        super().__init__(name, command, args, env)
+        self.target = target
+        self.connection = None
+        
+    def remote_command(self) -> str:
+        """Build the shell command line run on the remote host."""
+        argv = [self.command, *self.args]
+        if self.env:
+            # Passed through env(1), sshd usually refuses environment requests
+            argv = ["env", *(f"{key}={value}" for key, value in self.env.items()), *argv]
+        return shlex.join(argv)
+        
+    async def _start_process(self):
+        """Open a channel on the shared connection and start the server in it."""
+        if self.connection is None:
+            self.connection = await ssh_pool.acquire(self.target)
+        process = await self.connection.create_process(self.remote_command(), encoding=None)
+        logger.info(f"Started {self.name} on {self.target}")
+        return process
+        
+    async def connect(self):
+        """Start the MCP server on the remote host."""
+        if await super().connect():
+            return True
+        await self._release_connection()
+        return False
+        
+    async def _close_stdin(self):
+        """Send EOF on the channel, leaving it open for the server's exit status."""
+        try:
+            self.process.stdin.write_eof()
+        except Exception as e:
+            logger.debug(f"Error sending EOF to {self.name}: {str(e)}")
+            
+    async def _kill(self):
+        """Close the channel, sshd hangs up on the server if it has not exited."""
+        try:
+            self.process.kill()
+        except OSError:
+            pass  # The channel is already closed
+        self.process.close()
+        await asyncio.wait_for(self.process.wait_closed(), timeout=2.0)
+        
+    async def disconnect(self):
+        """Stop the remote server and release the shared connection."""
+        await super().disconnect()
+        await self._release_connection()
+        
+    async def _release_connection(self):
+        """Give the connection back to the pool."""
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            await ssh_pool.release(connection)
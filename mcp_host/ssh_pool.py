@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+import asyncssh
+
+logger = logging.getLogger("mcp-host")
+
+KEEPALIVE_INTERVAL = 30  # seconds between keepalives, so a dead connection is noticed
+KEEPALIVE_COUNT_MAX = 3  # unanswered keepalives before the connection is dropped
+CONNECT_TIMEOUT = 15     # seconds allowed for TCP connect plus SSH handshake
+
+@dataclass(frozen=True)
+class SSHTarget:
+    """Where and as whom to connect; servers with equal targets share a connection."""
+    host: str
+    port: int = 22
+    username: Optional[str] = None  # Defaults to the local user or ~/.ssh/config
+    client_keys: Tuple[str, ...] = ()  # Private key files, empty to use the agent and default keys
+    known_hosts: Optional[str] = None  # Known hosts file, None for ~/.ssh/known_hosts
+    
+    def __str__(self) -> str:
+        user = f"{self.username}@" if self.username else ""
+        return f"{user}{self.host}:{self.port}"
+
+class _PooledConnection:
+    """One connection attempt to a target and the servers using it."""
+    
+    def __init__(self, target: SSHTarget, future: "asyncio.Future[asyncssh.SSHClientConnection]"):
+        self.target = target
+        self.future = future
+        self.users = 0
+        
+    def usable(self) -> bool:
+        """Whether the connection is still being opened or is open."""
+        if not self.future.done():
+            return True
+        return self.future.exception() is None and not self.future.result().is_closed()
+
+class SSHPool:
+    """SSH connections shared by every server running on the same remote host.
+    
+    Each server runs as its own channel on the connection, so starting
+    another server on a host costs a channel open rather than a TCP and
+    key exchange. A connection is opened by the first acquire for its
+    target and closed when the last server using it releases it.
+    """
+    
+    def __init__(self):
+        self._connections: Dict[SSHTarget, _PooledConnection] = {}  # Current connection per target
+        self._acquired: Dict[asyncssh.SSHClientConnection, _PooledConnection] = {}  # Connections in use, so release finds the right one
+        self._stats = {
+            "connections_opened": 0,
+            "channels_opened": 0
+        }
+        
+    async def _open(self, target: SSHTarget) -> asyncssh.SSHClientConnection:
+        """Open a new connection to target."""
+        options = {}
+        if target.username:
+            options["username"] = target.username
+        if target.client_keys:
+            options["client_keys"] = list(target.client_keys)
+        if target.known_hosts is not None:
+            options["known_hosts"] = target.known_hosts
+            
+        connection = await asyncio.wait_for(
+            asyncssh.connect(
+                target.host,
+                port=target.port,
+                keepalive_interval=KEEPALIVE_INTERVAL,
+                keepalive_count_max=KEEPALIVE_COUNT_MAX,
+                **options
+            ),
+            timeout=CONNECT_TIMEOUT
+        )
+        self._stats["connections_opened"] += 1
+        logger.info(f"Opened SSH connection to {target}")
+        return connection
+        
+    async def acquire(self, target: SSHTarget) -> asyncssh.SSHClientConnection:
+        """Get the shared connection to target, opening it if needed. Pair every call with release()."""
+        pooled = self._connections.get(target)
+        if pooled is None or not pooled.usable():
+            # Failed or lost, open a fresh one; servers still on the old one release it themselves
+            pooled = _PooledConnection(target, asyncio.ensure_future(self._open(target)))
+            self._connections[target] = pooled
+            
+        try:
+            # Servers starting concurrently wait on the same connection attempt
+            connection = await asyncio.shield(pooled.future)
+        except Exception:
+            if self._connections.get(target) is pooled and not pooled.users:
+                del self._connections[target]
+            raise
+            
+        pooled.users += 1
+        self._acquired[connection] = pooled
+        self._stats["channels_opened"] += 1
+        return connection
+        
+    async def release(self, connection: asyncssh.SSHClientConnection):
+        """Give up one use of a connection from acquire(), closing it after its last user."""
+        pooled = self._acquired.get(connection)
+        if pooled is None:
+            return
+        pooled.users -= 1
+        if pooled.users > 0:
+            return
+            
+        del self._acquired[connection]
+        if self._connections.get(pooled.target) is pooled:
+            del self._connections[pooled.target]
+            
+        connection.close()
+        try:
+            await asyncio.wait_for(connection.wait_closed(), timeout=2.0)
+            logger.info(f"Closed SSH connection to {pooled.target}")
+        except asyncio.TimeoutError:
+            logger.warning(f"Timeout closing SSH connection to {pooled.target}")
+        except Exception as e:
+            logger.debug(f"Error closing SSH connection to {pooled.target} (non-critical): {str(e)}")
+            
+    def stats(self) -> Dict[str, Any]:
+        """Get connection counters for the pool."""
+        return {
+            "open": sum(1 for pooled in self._acquired.values() if pooled.usable()),
+            "users": sum(pooled.users for pooled in self._acquired.values()),
+            **self._stats
+        }
+
+# The host-wide pool
+ssh_pool = SSHPool()
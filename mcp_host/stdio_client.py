@@ -2,11 +2,12 @@ import os
 import json
 import asyncio
 import logging
-import time
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 
 logger = logging.getLogger("mcp-host")
 
+STDOUT_LIMIT = 16 * 1024 * 1024  # Longest message line read from a server, asyncio's default is 64 KiB
+
 class StdioClient:
     """Client for communicating with an MCP server via stdin/stdout."""
     
@@ -17,13 +18,13 @@ class StdioClient:
         self.env = env or {}
         self.process = None
         self.initialized = False
+        self._pending: Dict[Any, asyncio.Future] = {}  # Outstanding requests keyed by JSON-RPC id
+        self._reader_task = None
+        self._write_lock = asyncio.Lock()
+        self.notification_handler: Optional[Callable[[Dict[str, Any]], None]] = None
     
     async def connect(self):
         """Start the MCP server process."""
-        env = os.environ.copy()
-        if self.env:
-            env.update(self.env)
-        
         try:
             # Create a stopping event for the stderr logging task
             self._stderr_stop_event = asyncio.Event()
@@ -56,23 +57,45 @@ class StdioClient:
                     # Task was cancelled, exit cleanly
                     logger.debug(f"Stderr logging task for {self.name} was cancelled")
                     
-            self.process = await asyncio.create_subprocess_exec(
-                self.command,
-                *self.args,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                env=env
-            )
+            self.process = await self._start_process()
             
             # Start stderr logging task
             self._stderr_task = asyncio.create_task(log_stderr())
             
+            # Start the single stdout reader that demultiplexes responses
+            self._reader_task = asyncio.create_task(self._read_stdout())
+            
             logger.info(f"Started stdio server: {self.name}")
             return True
         except Exception as e:
             logger.error(f"Failed to start stdio server {self.name}: {str(e)}")
             return False
+            
+    async def _start_process(self):
+        """Launch the server with pipes for stdin, stdout and stderr."""
+        env = os.environ.copy()
+        if self.env:
+            env.update(self.env)
+            
+        return await asyncio.create_subprocess_exec(
+            self.command,
+            *self.args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            limit=STDOUT_LIMIT
+        )
+        
+    async def _close_stdin(self):
+        """Close the server's stdin, asking it to exit."""
+        if self.process.stdin:
+            await self._safe_close_transport(self.process.stdin)
+            
+    async def _kill(self):
+        """Forcibly stop the server and wait for it to go."""
+        self.process.kill()
+        await self.process.wait()
     
     async def disconnect(self):
         """Terminate the server process according to the MCP stdio shutdown protocol."""
@@ -97,10 +120,21 @@ class StdioClient:
                     
                 self._stderr_task = None
             
+            # Stop the stdout reader and fail anything still waiting on it
+            if self._reader_task and not self._reader_task.done():
+                self._reader_task.cancel()
+                try:
+                    await asyncio.wait_for(self._reader_task, timeout=1.0)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    pass
+                except Exception as e:
+                    logger.error(f"Error cancelling stdout reader for {self.name}: {str(e)}")
+            self._reader_task = None
+            self._fail_pending(RuntimeError(f"Server {self.name} was disconnected"))
+            
             # 1. Close stdin to the child process using safe transport close
             logger.debug(f"Closing stdin for {self.name}")
-            if self.process.stdin:
-                await self._safe_close_transport(self.process.stdin)
+            await self._close_stdin()
             
             # 2. Wait for the process to exit (with timeout)
             logger.debug(f"Waiting for {self.name} to exit")
@@ -125,77 +159,110 @@ class StdioClient:
             
             # 4. Send SIGKILL if the process still doesn't exit
             logger.warning(f"Sending SIGKILL to {self.name}")
-            self.process.kill()
-            await self.process.wait()
+            await self._kill()
             logger.info(f"Server {self.name} killed")
         except Exception as e:
             logger.error(f"Error during shutdown of {self.name}: {str(e)}")
         
         self.process = None
     
-    async def send_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+    async def send_message(self, message: Dict[str, Any], timeout: float = 10.0) -> Dict[str, Any]:
+        """Send a message and wait for the matching response.
+        
+        Any number of requests may be in flight at once; the background reader
+        task resolves each one by its JSON-RPC id.
+        """
         if not self.process or not self.process.stdin or not self.process.stdout:
             raise RuntimeError(f"Server {self.name} is not running")
+        if self._reader_task is None or self._reader_task.done():
+            # Nobody would resolve the response, fail now rather than at the timeout
+            raise RuntimeError(f"Server {self.name} is not reading output")
         
-        request_str = json.dumps(message) + "\n"
-        logger.debug(f"Sending message to {self.name}: {request_str}")
-        self.process.stdin.write(request_str.encode())
-        await self.process.stdin.drain()
-        
-        if "method" in message and "id" not in message:
-            logger.debug(f"Sent notification to {self.name}, no response expected")
-            return {}
+        is_notification = "method" in message and "id" not in message
         
-        # Store the request ID for matching with responses
+        # Register the waiter before writing so a fast reply can't be missed
         request_id = message.get("id")
+        future = None
+        if not is_notification:
+            if request_id in self._pending:
+                raise RuntimeError(f"Duplicate request id {request_id} for {self.name}")
+            future = asyncio.get_running_loop().create_future()
+            self._pending[request_id] = future
         
-        # Add timeout to prevent hanging
-        start_time = time.time()
-        timeout = 10.0  # 10 second timeout
-        
-        # Keep reading lines until we get a proper response matching our request ID
-        while time.time() - start_time < timeout:
+        try:
+            request_str = json.dumps(message) + "\n"
+            logger.debug(f"Sending message to {self.name}: {request_str}")
+            async with self._write_lock:
+                self.process.stdin.write(request_str.encode())
+                await self.process.stdin.drain()
+            
+            if is_notification:
+                logger.debug(f"Sent notification to {self.name}, no response expected")
+                return {}
+            
             try:
-                response_line = await asyncio.wait_for(
-                    self.process.stdout.readline(), 
-                    timeout=2.0  # Shorter timeout for each read attempt
-                )
+                return await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Timeout waiting for response with ID {request_id} from {self.name}")
+                raise TimeoutError(f"Timeout waiting for response from {self.name}")
+        finally:
+            if future is not None:
+                self._pending.pop(request_id, None)
+    
+    async def _read_stdout(self):
+        """Read messages from the server and route responses to their waiters."""
+        try:
+            while True:
+                try:
+                    response_line = await self.process.stdout.readline()
+                except ValueError as e:
+                    # A line over the limit is dropped, the reader carries on with the next one
+                    logger.error(f"Skipped oversized message from {self.name}: {str(e)}")
+                    continue
+                if not response_line:
+                    # End of stream, the server has exited
+                    logger.debug(f"stdout closed for {self.name}")
+                    break
                 
+                response_line = response_line.strip()
                 if not response_line:
-                    continue  # Skip empty lines
-                    
+                    continue  # Skip blank lines
+                
                 try:
-                    response = json.loads(response_line.decode())
-                    logger.debug(f"Received message from {self.name}: {response}")
-                    
-                    # Check if this is a notification (no id field)
-                    if "id" not in response and "method" in response:
-                        # Handle notification separately
-                        logger.debug(f"Received notification: {response['method']}")
-                        # You might want to store notifications somewhere or process them
-                        continue  # Continue waiting for the actual response
-                    
-                    # Check if this is our response (matching id)
-                    if "id" in response and response["id"] == request_id:
-                        logger.debug(f"Matched response with request id: {request_id}")
-                        return response
-                    
-                    # If we got here, we received a response for a different request
-                    # This should be rare but possible in asynchronous environments
-                    logger.warning(f"Received response with non-matching ID. Expected {request_id}, got {response.get('id')}")
-                    
+                    response = json.loads(response_line)
                 except json.JSONDecodeError as e:
                     logger.error(f"Error parsing message from {self.name}: {str(e)}")
                     logger.debug(f"Raw message content: {response_line}")
                     continue
-                    
-            except asyncio.TimeoutError:
-                # This is just a timeout for a single read attempt, not the overall timeout
-                continue
-        
-        # If we get here, we've timed out waiting for a matching response
-        logger.error(f"Timeout waiting for response with ID {request_id} from {self.name}")
-        raise TimeoutError(f"Timeout waiting for response from {self.name}")
+                
+                logger.debug(f"Received message from {self.name}: {response}")
+                
+                # Notifications and server-initiated requests carry a method
+                if "method" in response:
+                    logger.debug(f"Received notification: {response['method']}")
+                    if "id" not in response and self.notification_handler:
+                        self.notification_handler(response)
+                    continue
+                
+                future = self._pending.get(response.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(response)
+                else:
+                    logger.warning(f"Received response for unknown request ID {response.get('id')} from {self.name}")
+        except asyncio.CancelledError:
+            logger.debug(f"stdout reader task for {self.name} was cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Error reading stdout from {self.name}: {str(e)}")
+        finally:
+            self._fail_pending(RuntimeError(f"Server {self.name} closed its output stream"))
+    
+    def _fail_pending(self, exc: Exception):
+        """Fail every outstanding request with the given exception."""
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
         
     # Add this in stdio_client.py
     async def _safe_close_transport(self, transport):
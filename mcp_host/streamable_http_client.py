@@ -0,0 +1,227 @@
+import json
+import asyncio
+import logging
+from typing import Dict, Any, Awaitable, Callable, Optional
+import aiohttp
+
+from .http_pool import http_pool
+from .sse_parser import SSEParser
+
+logger = logging.getLogger("mcp-host")
+
+SESSION_HEADER = "Mcp-Session-Id"
+HANDSHAKE_METHODS = ("initialize", "notifications/initialized")  # Sent before a session exists
+
+class StreamableHTTPClient:
+    """Client for communicating with an MCP server via the Streamable HTTP transport.
+    
+    Every message is a single POST to the server's endpoint. The reply is
+    either a JSON body or a short SSE stream ending with the response, so a
+    request costs one HTTP exchange on a pooled keep-alive connection.
+    """
+    
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.url = url
+        self.session = None
+        self.session_id: Optional[str] = None  # Assigned by the server in reply to initialize
+        self.initialized = False
+        self.notification_handler: Optional[Callable[[Dict[str, Any]], None]] = None
+        # Called when the server has expired our session, re-runs the MCP handshake
+        self.session_lost_handler: Optional[Callable[[], Awaitable[bool]]] = None
+        self._listen_task = None
+        self._session_lock = asyncio.Lock()
+        
+    async def connect(self):
+        """Prepare the pooled HTTP session; the server is first contacted by initialize."""
+        if self.session is None:
+            self.session = http_pool.acquire()
+        self.session_id = None
+        logger.info(f"Using Streamable HTTP endpoint for server: {self.name}")
+        return True
+        
+    def _headers(self) -> Dict[str, str]:
+        """Headers for a request on the current session."""
+        headers = {
+            "Accept": "application/json, text/event-stream",
+            "Content-Type": "application/json"
+        }
+        if self.session_id:
+            headers[SESSION_HEADER] = self.session_id
+        return headers
+        
+    async def send_message(self, message: Dict[str, Any], timeout: float = 30.0) -> Dict[str, Any]:
+        """Send a message and return the server's response to it."""
+        if not self.session:
+            raise RuntimeError(f"No session for {self.name}")
+            
+        handshake = message.get("method") in HANDSHAKE_METHODS
+        try:
+            if not handshake and self._session_lock.locked():
+                # A new session is being set up, wait for it rather than send the expired id
+                async with self._session_lock:
+                    pass
+            return await asyncio.wait_for(self._exchange(message), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout waiting for response from {self.name}")
+            raise TimeoutError(f"Timeout waiting for response to request {message.get('id')}")
+        except SessionExpiredError as e:
+            # The server forgot our session: start a new one and try once more
+            if handshake or not self.session_lost_handler:
+                raise
+            await self._renew_session(e.session_id)
+            return await asyncio.wait_for(self._exchange(message), timeout=timeout)
+            
+    async def _renew_session(self, expired: str):
+        """Replace an expired session, once even if several requests noticed it."""
+        async with self._session_lock:
+            if self.session_id != expired:
+                return  # Another request already renewed it
+            logger.info(f"Session for {self.name} expired, re-initializing")
+            self.session_id = None
+            if not await self.session_lost_handler():
+                raise ConnectionError(f"Failed to re-initialize session with {self.name}")
+                
+    async def _exchange(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """POST one message and read the reply, JSON or SSE."""
+        logger.debug(f"Sending message to {self.url}: {json.dumps(message)}")
+        sent_session_id = self.session_id
+        async with self.session.post(
+            self.url,
+            data=json.dumps(message).encode(),
+            headers=self._headers(),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=10)
+        ) as response:
+            if response.status == 404 and sent_session_id:
+                raise SessionExpiredError(sent_session_id)
+            if response.status >= 400:
+                error_text = await response.text()
+                raise RuntimeError(f"Server returned error: {response.status} - {error_text}")
+                
+            session_id = response.headers.get(SESSION_HEADER)
+            if session_id and session_id != self.session_id:
+                self.session_id = session_id
+                logger.debug(f"Got session id for {self.name}: {session_id}")
+                
+            # Notifications and responses are only acknowledged
+            if "id" not in message or "method" not in message or response.status == 202:
+                if message.get("method") == "notifications/initialized":
+                    self._start_listening()
+                return {}
+                
+            content_type = response.headers.get("Content-Type", "")
+            if content_type.startswith("text/event-stream"):
+                return await self._read_event_stream(response, message["id"])
+                
+            result = await response.json(content_type=None)
+            if isinstance(result, list):
+                # A batch reply, pick out our response
+                result = next((item for item in result if item.get("id") == message["id"]), {})
+            return result
+            
+    async def _read_event_stream(self, response, request_id) -> Dict[str, Any]:
+        """Read an SSE reply until the response to request_id arrives."""
+        async for event in self._iter_events(response):
+            if event.event != "message":
+                continue
+            try:
+                message_obj = json.loads(event.data)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                logger.error(f"Received invalid JSON in message event from {self.name}")
+                continue
+                
+            if "method" not in message_obj and message_obj.get("id") == request_id:
+                return message_obj
+            self._dispatch(message_obj)
+        raise ConnectionError(f"Stream from {self.name} ended before the response to request {request_id}")
+        
+    async def _iter_events(self, response):
+        """Yield the events of an SSE response body, including one left unterminated at its end.
+        
+        Unlike WHATWG, a last event without its blank line is delivered: the
+        body ended cleanly under HTTP framing, aiohttp raises on a truncated
+        one, and some servers close the reply right after the response.
+        """
+        parser = SSEParser()
+        async for chunk in response.content.iter_any():
+            for event in parser.feed(chunk):
+                yield event
+        for event in parser.flush(complete_partial=True):
+            yield event
+            
+    def _dispatch(self, message_obj: Dict[str, Any]):
+        """Dispatch a server notification received outside a response."""
+        if "method" in message_obj:
+            logger.debug(f"Received notification: {message_obj['method']}")
+            if "id" not in message_obj and self.notification_handler:
+                self.notification_handler(message_obj)
+                
+    def _start_listening(self):
+        """Open the optional GET stream for notifications the server sends on its own."""
+        if self._listen_task is None or self._listen_task.done():
+            self._listen_task = asyncio.create_task(self._listen())
+            
+    async def _listen(self):
+        """Route messages from the server's GET stream until it closes."""
+        try:
+            headers = {"Accept": "text/event-stream"}
+            if self.session_id:
+                headers[SESSION_HEADER] = self.session_id
+            async with self.session.get(
+                self.url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10)
+            ) as response:
+                if response.status != 200:
+                    # 405 means the server doesn't offer a stream, which is fine
+                    logger.debug(f"No notification stream from {self.name} ({response.status})")
+                    return
+                    
+                async for event in self._iter_events(response):
+                    if event.event != "message":
+                        continue
+                    try:
+                        self._dispatch(json.loads(event.data))
+                    except Exception as e:
+                        logger.error(f"Error handling message from {self.name}: {str(e)}")
+            logger.debug(f"Notification stream from {self.name} closed")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Notification stream from {self.name} failed: {str(e)}")
+            
+    async def disconnect(self):
+        """End the MCP session and release the pooled HTTP session."""
+        if self._listen_task and not self._listen_task.done():
+            self._listen_task.cancel()
+            try:
+                await asyncio.wait_for(self._listen_task, timeout=2.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        self._listen_task = None
+        
+        if self.session and self.session_id:
+            # Tell the server it can drop the session, servers may not support it
+            try:
+                async with self.session.delete(
+                    self.url,
+                    headers={SESSION_HEADER: self.session_id},
+                    timeout=aiohttp.ClientTimeout(total=2.0)
+                ) as response:
+                    logger.debug(f"Ended session with {self.name} ({response.status})")
+            except Exception as e:
+                logger.debug(f"Error ending session with {self.name} (non-critical): {str(e)}")
+        self.session_id = None
+        
+        if self.session:
+            self.session = None
+            await http_pool.release()
+            
+        logger.info(f"Disconnected from Streamable HTTP server: {self.name}")
+
+class SessionExpiredError(ConnectionError):
+    """The server no longer knows the session id we sent."""
+    
+    def __init__(self, session_id: str):
+        super().__init__(f"Session {session_id} expired")
+        self.session_id = session_id
@@ -0,0 +1,63 @@
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger("mcp-host")
+
+def make_call_key(namespaced_tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Build a canonical key for a tool call, independent of argument order."""
+    canonical_args = json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{namespaced_tool_name}:{canonical_args}"
+
+def is_error_result(result: Dict[str, Any]) -> bool:
+    """Check whether a tool result reports a failure."""
+    return not isinstance(result, dict) or "error" in result or bool(result.get("isError"))
+
+class ToolResultCache:
+    """Size-bounded LRU cache of tool results, each entry with its own TTL."""
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()  # Key -> (expiry, result)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get a cached result, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            del self._entries[key]
+            
+        self.misses += 1
+        return None
+        
+    def put(self, key: str, result: Dict[str, Any], ttl: float):
+        """Cache a result for ttl seconds, evicting the least recently used entries when full."""
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+            
+        self._entries[key] = (time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+            
+    def stats(self) -> Dict[str, int]:
+        """Get the cache counters."""
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+        
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,118 @@
+import re
+import math
+import logging
+from collections import Counter
+from typing import Dict, List, Any, Iterable
+
+logger = logging.getLogger("mcp-host")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_WEIGHT = 3  # Name terms count this many times, a name match is the strongest signal
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "get", "give",
+    "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "please", "the", "this", "to",
+    "use", "what", "whats", "when", "where", "which", "with", "you", "your"
+})
+
+_WORD_RE = re.compile(r"[A-Za-z0-9]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase terms, breaking snake_case and camelCase identifiers apart."""
+    terms = []
+    for word in _WORD_RE.findall(text or ""):
+        for part in _CAMEL_RE.findall(word):
+            part = part.lower()
+            if part not in STOP_WORDS:
+                terms.append(part)
+    return terms
+
+class ToolIndex:
+    """BM25 index over tool names, descriptions and parameter names.
+    
+    Built locally from the tool catalog, so ranking tools against a prompt
+    needs no network and no embedding model.
+    """
+    
+    def __init__(self, tools: List[Dict[str, Any]]):
+        self.tools = tools
+        self._term_freqs: List[Counter] = []
+        self._lengths: List[int] = []
+        self._doc_freqs: Counter = Counter()
+        
+        for tool in tools:
+            terms = self._tool_terms(tool)
+            freqs = Counter(terms)
+            self._term_freqs.append(freqs)
+            self._lengths.append(len(terms))
+            self._doc_freqs.update(freqs.keys())
+            
+        self._avg_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+        
+    def _tool_terms(self, tool: Dict[str, Any]) -> List[str]:
+        """Get the indexed terms of one tool."""
+        # Drop the server prefix from the name, the server name says little about the tool
+        name = tool["name"].split("__", 1)[-1]
+        terms = tokenize(name) * NAME_WEIGHT
+        terms += tokenize(tool.get("description", ""))
+        
+        schema = tool.get("inputSchema") or {}
+        for param_name in (schema.get("properties") or {}):
+            terms += tokenize(param_name)
+        return terms
+        
+    def _idf(self, term: str) -> float:
+        """Inverse document frequency of a term, never negative."""
+        doc_freq = self._doc_freqs.get(term, 0)
+        return math.log(1 + (len(self.tools) - doc_freq + 0.5) / (doc_freq + 0.5))
+        
+    def scores(self, query: str) -> List[float]:
+        """Score every tool against a query, in catalog order."""
+        query_terms = set(tokenize(query))
+        idfs = {term: self._idf(term) for term in query_terms if term in self._doc_freqs}
+        
+        scores = []
+        for freqs, length in zip(self._term_freqs, self._lengths):
+            score = 0.0
+            for term, idf in idfs.items():
+                freq = freqs.get(term)
+                if freq:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self._avg_length or 1))
+                    score += idf * freq * (BM25_K1 + 1) / (freq + norm)
+            scores.append(score)
+        return scores
+        
+    def search(self, query: str, top_k: int, always_include: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """Get the tools most relevant to a query, in catalog order.
+        
+        Args:
+            query: Text to rank the tools against, usually the user's prompt
+            top_k: Maximum number of ranked tools to return
+            always_include: Tool names, namespaced or not, returned regardless of rank
+            
+        Returns:
+            The always-included tools plus up to top_k tools with a non-zero
+            score, or every tool if none matches the query at all
+        """
+        scores = self.scores(query)
+        if not any(scores):
+            logger.debug("No tool matched the prompt, selecting all tools")
+            return list(self.tools)
+        
+        always_include = set(always_include)
+        selected = {
+            i for i, tool in enumerate(self.tools)
+            if tool["name"] in always_include or tool["name"].split("__", 1)[-1] in always_include
+        }
+        
+        ranked = sorted(
+            (i for i, score in enumerate(scores) if score > 0 and i not in selected),
+            key=lambda i: -scores[i]
+        )
+        selected.update(ranked[:top_k])
+        
+        logger.debug(f"Selected {len(selected)} of {len(self.tools)} tools for the prompt")
+        return [self.tools[i] for i in sorted(selected)]
@@ -133,9 +133,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run MCP SSE-based server')
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--transport', choices=['sse', 'streamable-http'], default='sse',
+                        help='Serve over SSE (/sse) or Streamable HTTP (/mcp)')
     args = parser.parse_args()
 
-    # Bind SSE request handling to MCP server
-    starlette_app = create_starlette_app(mcp_server, debug=True)
+    if args.transport == 'streamable-http':
+        # FastMCP serves Streamable HTTP itself, on a single /mcp endpoint
+        starlette_app = mcp.streamable_http_app()
+    else:
+        # Bind SSE request handling to MCP server
+        starlette_app = create_starlette_app(mcp_server, debug=True)
 
     uvicorn.run(starlette_app, host=args.host, port=args.port)